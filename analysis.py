@@ -0,0 +1,217 @@
+# Static analysis of compiled programs: duration, per-device on-time and
+# likely mistakes, plus a time index answering "what is active at t" and
+# "how long is left" in O(log n). Kivy-free, so the simulator can use it.
+from bisect import bisect_right
+from collections import namedtuple
+
+from sequence import DEVICES, Repeat, expand_device
+
+# A likely mistake at `offset` seconds into the program
+Conflict = namedtuple('Conflict', ('offset', 'device', 'message'))
+
+
+# Marks a device a block leaves as it found it
+KEEP = object()
+
+
+def overlay(states, effect):
+    return tuple(state if change is KEEP else change for state, change in zip(states, effect))
+
+
+class BlockIndex(object):
+    # Start offsets of a block's items and, for each item, the combined
+    # effect of the items before it on every device. Built once per block,
+    # so a loop body or subroutine is indexed once however often it runs.
+    def __init__(self, block, effects):
+        self.block = block
+        self.offsets = [item.offset for item in block.items]
+        self.before = []
+        effect = (KEEP,) * len(DEVICES)
+        for item in block.items:
+            self.before.append(effect)
+            effect = overlay(effect, effects(item))
+        self.effect = effect
+
+
+class BlockUsage(object):
+    # What a block does to each device, worked out for both states the device
+    # can be in when the block starts: (seconds on within the block, on at
+    # the end, first occurrence of each mistake with offsets relative to the
+    # block). Mistakes with unknown devices do not depend on the state.
+    def __init__(self, devices, unknown):
+        self.devices = devices
+        self.unknown = unknown
+
+
+class TimelineIndex(object):
+    # Answers "what is active at t" on the compiled block tree instead of the
+    # expanded steps: a bisect finds the item running at t in each block, and
+    # a loop maps t into its current iteration. Step offsets are already the
+    # prefix sums of the delays, so each level costs O(log n).
+    def __init__(self, timeline):
+        self.duration = timeline.duration
+        self.blocks = {}
+        self.usages = {}
+        self.root = self.index(timeline.block)
+
+    def index(self, block):
+        index = self.blocks.get(id(block))
+        if index is None:
+            index = self.blocks[id(block)] = BlockIndex(block, self.effect)
+        return index
+
+    def effect(self, item):
+        if isinstance(item, Repeat):
+            return self.index(item.block).effect if item.times else (KEEP,) * len(DEVICES)
+        return tuple(
+            (item.level if item.action == 'start' else None) if device in expand_device(item.device) else KEEP
+            for device in DEVICES)
+
+    def usage(self, block):
+        usage = self.usages.get(id(block))
+        if usage is None:
+            unknown = {}
+            for item in block.items:
+                if isinstance(item, Repeat):
+                    if item.times:
+                        for conflict in self.usage(item.block).unknown:
+                            unknown.setdefault(conflict.message, conflict._replace(offset=item.offset + conflict.offset))
+                    continue
+                for device in expand_device(item.device):
+                    if device not in DEVICES:
+                        message = f"unknown device {device!r}"
+                        unknown.setdefault(message, Conflict(item.offset, device, message))
+            devices = {device: (self.device_usage(block, device, False), self.device_usage(block, device, True))
+                       for device in DEVICES}
+            usage = self.usages[id(block)] = BlockUsage(devices, tuple(unknown.values()))
+        return usage
+
+    def device_usage(self, block, device, on):
+        on_time = 0.0
+        since = 0.0
+        conflicts = {}
+
+        def report(offset, message):
+            conflicts.setdefault(message, Conflict(offset, device, message))
+
+        for item in block.items:
+            if isinstance(item, Repeat):
+                if not item.times:
+                    continue
+                if on:
+                    on_time += item.offset - since
+                body = self.usage(item.block).devices[device]
+                seconds, on, first = repeat_usage(body, on, item.times, item.block.duration)
+                on_time += seconds
+                since = item.offset + item.duration
+                for conflict in first:
+                    report(item.offset + conflict.offset, conflict.message)
+            elif device not in expand_device(item.device):
+                continue
+            elif item.action == 'start':
+                if item.level is None:
+                    report(item.offset, f"start {device} without a level")
+                if not on:
+                    # A restart only changes the level; the device stays on
+                    on = True
+                    since = item.offset
+            elif on:
+                on_time += item.offset - since
+                on = False
+            elif item.device == device:
+                # "Stop All" is the usual way to end a program, so only an
+                # explicit stop of an idle device is reported
+                report(item.offset, f"stop {device} while it is not running")
+        if on:
+            on_time += block.duration - since
+        return on_time, on, tuple(conflicts.values())
+
+    def states_at(self, index, elapsed, states):
+        position = bisect_right(index.offsets, elapsed) - 1
+        if position < 0:
+            return states
+        states = overlay(states, index.before[position])
+        item = index.block.items[position]
+        if not isinstance(item, Repeat):
+            return overlay(states, self.effect(item))
+        body = self.index(item.block)
+        local = elapsed - item.offset
+        if not item.block.duration or local >= item.duration:
+            # Finished (or instantaneous): every iteration has fired
+            return overlay(states, body.effect)
+        iteration = int(local // item.block.duration)
+        if iteration:
+            # Every iteration leaves the devices in the same state
+            states = overlay(states, body.effect)
+        return self.states_at(body, local - iteration * item.block.duration, states)
+
+    def active_at(self, elapsed):
+        # {device: level} for the devices running `elapsed` seconds in
+        states = self.states_at(self.root, elapsed, (None,) * len(DEVICES))
+        return {device: level for device, level in zip(DEVICES, states) if level is not None}
+
+    def remaining(self, elapsed):
+        return max(0.0, self.duration - elapsed)
+
+    def progress(self, elapsed):
+        if not self.duration:
+            return 1.0
+        return min(1.0, max(0.0, elapsed / self.duration))
+
+
+class Analysis(object):
+    def __init__(self, duration, on_time, conflicts, index):
+        self.duration = duration
+        # Seconds each device spends running over the whole program
+        self.on_time = on_time
+        self.conflicts = conflicts
+        self.index = index
+
+
+def repeat_usage(body, on, times, duration):
+    # (seconds on, on at the end, first mistakes) over `times` runs of a body
+    # with per-state usage `body`. A body either sets a device (its last
+    # start or stop) or leaves it as it was, so every run after the first
+    # starts in the state the first one ends in and the rest are counted,
+    # not walked.
+    seconds = 0.0
+    first = {}
+    for iteration in range(min(times, 2)):
+        run, exit_on, conflicts = body[on]
+        seconds += run
+        for conflict in conflicts:
+            first.setdefault(conflict.message, conflict._replace(offset=iteration * duration + conflict.offset))
+        on = exit_on
+    if times > 2:
+        seconds += (times - 2) * body[on][0]
+    return seconds, on, tuple(first.values())
+
+
+def analyze(timeline):
+    # Works on the compiled blocks: each block's on-time and mistakes are
+    # computed once and a loop multiplies its body's by the repeat count, so
+    # the cost does not grow with the number of iterations. A mistake inside
+    # a loop is reported once, at its first occurrence.
+    index = TimelineIndex(timeline)
+    usage = index.usage(timeline.block)
+    on_time = {}
+    conflicts = list(usage.unknown)
+    running = []
+    for device in DEVICES:
+        seconds, on, first = usage.devices[device][False]
+        on_time[device] = seconds
+        conflicts.extend(first)
+        if on:
+            running.append(device)
+    conflicts.sort(key=lambda conflict: conflict.offset)
+    for device in running:
+        conflicts.append(Conflict(timeline.duration, device, f"{device} still running at the end"))
+    return Analysis(timeline.duration, on_time, conflicts, index)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,99 @@
+import struct
+from functools import lru_cache
+from queue import Full
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+from gpio import CMD_HP
+
+# Hardware PWM duty cycle range used by pigpiod (HP command)
+FULL_DUTY = 1000000
+# Perceived brightness is roughly duty ** (1 / GAMMA)
+GAMMA = 2.2
+# I/O worker key for the backlight; only the latest update matters
+WORKER_KEY = 'backlight'
+
+
+def duty_for(percent):
+    percent = min(100.0, max(0.0, percent))
+    return int(round(FULL_DUTY * (percent / 100.0) ** GAMMA))
+
+
+@lru_cache(maxsize=64)
+def ramp(start, end, steps):
+    # (percent, duty cycle) steps from `start` to `end` percent, evenly
+    # spaced in perceived brightness so the fade looks linear. Ramps are few
+    # and repeat (wake, standby, the brightness presets), so they are cached.
+    levels = [start + (end - start) * (i + 1) / steps for i in range(steps)]
+    return tuple((level, duty_for(level)) for level in levels)
+
+
+class Backlight(object):
+    # Display backlight on a pigpio hardware PWM pin (12, 13, 18 or 19).
+    # A fade is computed once up front and sent as `steps` duty cycle updates
+    # through the I/O worker, `fade` seconds in total, instead of a write per
+    # frame; a new fade replaces whatever is left of the previous one, and an
+    # update still queued on the worker is replaced by the next one.
+    # `brightness` is the user setting in percent; standby dims below it
+    # (see Standby).
+    def __init__(self, worker, pin, frequency=20000, brightness=100, fade=0.4, steps=8):
+        self.worker = worker
+        self.pin = pin
+        self.frequency = frequency
+        self.brightness = brightness
+        self.fade = fade
+        self.steps = max(1, steps)
+        # Percent of the last update handed to the worker
+        self.level = None
+        self._ramp = ()
+        self._event = None
+
+    def send(self, duty):
+        ext = struct.pack('<I', duty)
+        try:
+            self.worker.submit(WORKER_KEY, [(CMD_HP, self.pin, self.frequency, ext)])
+        except Full as exc:
+            Logger.warning(f"Backlight: dropped update: {exc}")
+
+    def set(self, percent):
+        # Jumps straight to `percent`
+        self.cancel()
+        self.level = percent
+        self.send(duty_for(percent))
+
+    def fade_to(self, percent, duration=None):
+        if self.level is None:
+            self.set(percent)
+            return
+        self.cancel()
+        if percent == self.level:
+            return
+        self._ramp = list(ramp(self.level, percent, self.steps))
+        duration = self.fade if duration is None else duration
+        self._event = Clock.schedule_interval(self._step, duration / self.steps)
+        self._step(0)
+
+    def _step(self, dt):
+        # Interrupted fades continue from the last level sent
+        self.level, duty = self._ramp.pop(0)
+        self.send(duty)
+        if not self._ramp:
+            self.cancel()
+
+    def cancel(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        self._ramp = ()
+
+    def set_brightness(self, percent):
+        self.brightness = percent
+        self.fade_to(percent)
+
+    def dim(self, fraction):
+        # Takes `fraction` off the user brightness; 1 turns the backlight off
+        self.fade_to(self.brightness * (1 - fraction))
+
+    def restore(self):
+        self.fade_to(self.brightness, duration=self.fade / 2)
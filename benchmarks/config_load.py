@@ -0,0 +1,83 @@
+# Cold versus warm program loading for a large generated program library:
+# pure-Python YAML, libyaml (CSafeLoader), and the content-hashed cache.
+#
+#   python benchmarks/config_load.py [--programs 50] [--actions 2000]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import programs  # noqa: E402
+
+
+def write_library(directory, count, length):
+    pattern = [
+        {'type': 'start', 'device': 'Steam', 'level': 'min'},
+        {'type': 'delay', 'amount': 5, 'unit': 'sec'},
+        {'type': 'stop', 'device': 'Steam'},
+        {'type': 'delay', 'amount': 1, 'unit': 'min'},
+    ]
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'p{i}.yaml')
+        actions = [dict(pattern[j % len(pattern)], amount=j) if j % 2 else dict(pattern[j % len(pattern)])
+                   for j in range(length)]
+        with open(path, 'w') as file:
+            yaml.dump({'actions': actions}, file, default_flow_style=False, sort_keys=False)
+        paths.append(path)
+    return paths
+
+
+def clear_cache(paths):
+    for path in paths:
+        try:
+            os.remove(programs.cache_path(path))
+        except FileNotFoundError:
+            pass
+
+
+def timed(label, fn, paths):
+    start = perf_counter()
+    for path in paths:
+        fn(path)
+    elapsed = perf_counter() - start
+    print(f"{label:32s} {elapsed * 1000:9.1f} ms  ({elapsed * 1000 / len(paths):.2f} ms/program)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--programs', type=int, default=50)
+    parser.add_argument('--actions', type=int, default=2000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_library(directory, args.programs, args.actions)
+        print(f"{args.programs} programs x {args.actions} actions, "
+              f"libyaml {'available' if programs.SafeLoader is not yaml.SafeLoader else 'missing'}")
+
+        def pure_python(path):
+            with open(path, 'rb') as file:
+                yaml.load(file, Loader=yaml.SafeLoader)
+
+        def libyaml(path):
+            with open(path, 'rb') as file:
+                programs.load_yaml(file)
+
+        timed('yaml.safe_load (pure Python)', pure_python, paths)
+        timed('CSafeLoader', libyaml, paths)
+        clear_cache(paths)
+        timed('parse_program, cold cache', programs.parse_program, paths)
+        timed('parse_program, warm cache', programs.parse_program, paths)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
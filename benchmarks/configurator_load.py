@@ -0,0 +1,77 @@
+# Time to load a long program into the configurator: model load plus the
+# first frame of the recycled brick list, and the number of row widgets.
+#
+#   python benchmarks/configurator_load.py [--steps 5000]
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+
+def write_program(path, steps):
+    actions = []
+    for i in range(steps):
+        if i % 2:
+            actions.append({'type': 'delay', 'amount': i % 1000, 'unit': 'sec'})
+        else:
+            actions.append({'type': 'start', 'device': 'Steam', 'level': 'min'})
+    with open(path, 'w') as file:
+        yaml.dump({'actions': actions}, file, default_flow_style=False, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'program.yaml')
+    write_program(path, args.steps)
+    os.chdir(ROOT)
+
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+
+    import configurator
+
+    timings = {}
+
+    class BenchApp(configurator.ConfigBuilderApp):
+        def on_start(self):
+            Clock.schedule_once(self.load, 0.5)
+
+        def load(self, dt):
+            start = perf_counter()
+            self.load_program(path)
+            timings['load'] = perf_counter() - start
+
+            def on_flip(*args):
+                Window.unbind(on_flip=on_flip)
+                timings['first_frame'] = perf_counter() - start
+                timings['rows'] = len(self.brick_container.children)
+                Clock.schedule_once(lambda dt: self.stop(), 0)
+
+            Window.bind(on_flip=on_flip)
+
+    try:
+        BenchApp().run()
+    finally:
+        shutil.rmtree(directory)
+    # An empty list would time a frame with nothing in it
+    assert timings['rows'] > 0, "no brick rows were created"
+    print(f"{args.steps} steps")
+    print(f"parse + model  {timings['load'] * 1000:8.1f} ms")
+    print(f"first frame    {timings['first_frame'] * 1000:8.1f} ms")
+    print(f"row widgets    {timings['rows']:8d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Event log costs: what an append costs the calling thread while the commit
+# thread runs, and how long queries take over a day of records (heater
+# samples at 10 Hz plus button presses and GPIO commands) in a temporary
+# log directory.
+#
+#   python benchmarks/eventlog.py [--appends 200000] [--rate 10]
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eventlog  # noqa: E402
+
+
+def append_cost(directory, appends):
+    log = eventlog.EventLog(directory).open()
+    start = perf_counter()
+    for i in range(appends):
+        log.append(eventlog.KIND_SAMPLE, 0, 500, 95.0)
+    elapsed = perf_counter() - start
+    log.close()
+    return elapsed / appends * 1e9
+
+
+def write_day(directory, rate):
+    log = eventlog.EventLog(directory, keep_raw=64).open()
+    day = 86400
+    start = time() - day
+    for i in range(int(day * rate)):
+        at = start + i / rate
+        log.append(eventlog.KIND_SAMPLE, 0, 500, 90.0 + (i % 100) / 20, at=at)
+        if i % 600 == 0:
+            log.append(eventlog.KIND_PRESS, i // 600 % 3, 3, at=at)
+            log.append(eventlog.KIND_COMMAND, 22, 5, 255.0, at=at)
+    log.close()
+
+
+def timed(label, function):
+    start = perf_counter()
+    records = function()
+    print(f"{label:28s} {(perf_counter() - start) * 1000:8.1f} ms  {len(records)} records")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--appends', type=int, default=200000)
+    parser.add_argument('--rate', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"append                       {append_cost(os.path.join(directory, 'cost'), args.appends):8.0f} ns")
+        day = os.path.join(directory, 'day')
+        write_day(day, args.rate)
+        size = sum(os.path.getsize(os.path.join(day, name)) for name in os.listdir(day))
+        print(f"one day on disk              {size / 1e6:8.1f} MB")
+        since = time() - 86400
+        timed("query: everything", lambda: eventlog.query(day, since=since))
+        timed("query: presses of Steam", lambda: eventlog.query(day, since=since, kinds=[eventlog.KIND_PRESS],
+                                                                devices=['Steam']))
+        timed("query: last hour", lambda: eventlog.query(day, since=time() - 3600))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Heater control loop against the simulated boiler. First a headless run of
+# each control law on simulated time (heat-up, overshoot, how tightly the
+# setpoint is held), then the real control thread for a few seconds while
+# the main thread keeps taking decimated snapshots, reporting tick jitter
+# and what a snapshot costs.
+#
+#   python benchmarks/heater.py [--minutes 30] [--rate 10] [--seconds 5]
+import argparse
+import os
+import statistics
+import sys
+from time import monotonic, perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from heater import HeaterController, SimulatedPlant, make_law  # noqa: E402
+from settings import DEFAULTS  # noqa: E402
+
+
+def control_quality(mode, minutes, rate):
+    config = DEFAULTS['heater']
+    plant = SimulatedPlant(clock=None, seed=1)
+    law = make_law(mode, config['band'], config['kp'], config['ki'], config['kd'])
+    controller = HeaterController(plant.read, plant.apply, law, config['setpoint'], rate, minutes * 60)
+    dt = 1.0 / rate
+    start = perf_counter()
+    for _ in range(int(minutes * 60 * rate)):
+        plant.advance(dt)
+        controller.step(dt)
+    elapsed = perf_counter() - start
+    snapshot = controller.samples.snapshot()
+    temperature = snapshot.temperature
+    reached = next((i for i, value in enumerate(temperature) if value >= config['setpoint'] - 0.5), None)
+    # Hold band over the last third of the run
+    tail = temperature[len(temperature) * 2 // 3:]
+    duty = sum(snapshot.output[len(temperature) * 2 // 3:]) / len(tail)
+    print(f"{mode:10s} setpoint after {reached / rate if reached is not None else float('nan'):6.0f}s  "
+          f"peak {max(temperature):6.2f}  hold {min(tail):6.2f}..{max(tail):6.2f}  duty {duty:4.0%}  "
+          f"({elapsed * 1000:.0f} ms for {minutes} simulated min)")
+
+
+def thread_jitter(rate, seconds):
+    ticks = []
+    plant = SimulatedPlant(speed=60.0)
+
+    def sensor():
+        ticks.append(monotonic())
+        return plant.read()
+
+    config = DEFAULTS['heater']
+    law = make_law('pid', config['band'], config['kp'], config['ki'], config['kd'])
+    controller = HeaterController(sensor, plant.apply, law, config['setpoint'], rate, history=600)
+    # Snapshots are timed on a full buffer, as after ten minutes of running
+    for _ in range(controller.samples.capacity):
+        controller.samples.append(plant.ambient, 0.0)
+    controller.start()
+    costs = []
+    end = monotonic() + seconds
+    while monotonic() < end:
+        # Stands in for the UI: a chart-sized snapshot every frame
+        start = perf_counter()
+        controller.samples.snapshot(400)
+        costs.append(perf_counter() - start)
+        sleep(1 / 60)
+    controller.stop()
+    intervals = [(b - a) * 1000 for a, b in zip(ticks, ticks[1:])]
+    period = 1000.0 / rate
+    print(f"thread     {len(ticks)} ticks at {rate} Hz  period median {statistics.median(intervals):.2f} ms  "
+          f"worst deviation {max(abs(i - period) for i in intervals):.2f} ms  overruns {controller.overruns}")
+    print(f"snapshot   {len(controller.samples)} samples -> 400 points  "
+          f"median {statistics.median(costs) * 1e6:.0f} us  worst {max(costs) * 1e6:.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=30)
+    parser.add_argument('--rate', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    for mode in ('pid', 'hysteresis'):
+        control_quality(mode, args.minutes, args.rate)
+    thread_jitter(args.rate, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Cost of the instrumentation hooks on the button -> GPIO path, disabled and
+# enabled, and a traced run of simulated button presses against the local
+# fake pigpiod, printing the resulting histograms.
+#
+#   python benchmarks/instrumentation.py [--presses 200] [--rtt-ms 8]
+import argparse
+import os
+import sys
+import threading
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+import instrumentation  # noqa: E402
+from devices import DeviceController  # noqa: E402
+from fake_pigpiod import FakePigpiod  # noqa: E402
+from gpio import PigpioPool  # noqa: E402
+from io_worker import IOWorker  # noqa: E402
+from settings import DEFAULTS  # noqa: E402
+
+# Device pins on the fake pigpiod
+PINS = {'Steam': 22, 'Hotwater': 23, 'Vacuum': 24}
+
+
+def report_inline(callback, key, error):
+    callback(key, error)
+
+
+def hook_cost(rounds=200000):
+    # Same shape as MainMenuScreen.toggle_device, minus the handler itself
+    start = perf_counter()
+    for _ in range(rounds):
+        trace = instrumentation.begin('Steam', None)
+        try:
+            pass
+        finally:
+            instrumentation.end(trace)
+    return (perf_counter() - start) / rounds * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--presses', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=8.0)
+    args = parser.parse_args()
+
+    instrumentation.disable()
+    print(f"hook disabled  {hook_cost():8.1f} ns per press")
+    instrumentation.enable()
+    print(f"hook enabled   {hook_cost():8.1f} ns per press")
+
+    server = FakePigpiod(latency=args.rtt_ms / 1000.0).start()
+    pool = PigpioPool('127.0.0.1', server.port)
+    worker = IOWorker(pool, report=report_inline).start()
+    devices = DeviceController(worker, PINS, DEFAULTS['levels'])
+    for i in range(args.presses):
+        done = threading.Event()
+        trace = instrumentation.begin('Steam', None)
+        devices.set('Steam', 'max' if i % 2 else None, lambda key, error: done.set())
+        instrumentation.end(trace)
+        done.wait(2)
+        sleep(0.001)
+    worker.stop()
+    pool.close()
+    server.stop()
+    print(instrumentation.format_summaries(instrumentation.recorder.summaries()))
+
+
+if __name__ == '__main__':
+    main()
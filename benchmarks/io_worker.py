@@ -0,0 +1,79 @@
+# Throughput and queueing latency of the pigpio I/O worker against the local
+# fake pigpiod, without hardware.
+#
+#   python benchmarks/io_worker.py [--commands 5000] [--latency-ms 0] [--burst 50]
+import argparse
+import os
+import statistics
+import sys
+import threading
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from fake_pigpiod import FakePigpiod  # noqa: E402
+from gpio import CMD_PWM, PigpioConnection  # noqa: E402
+from io_worker import IOWorker  # noqa: E402
+
+
+def report_inline(callback, key, error):
+    callback(key, error)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--commands', type=int, default=5000)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--burst', type=int, default=50,
+                        help='commands submitted back to back before pausing')
+    parser.add_argument('--devices', type=int, default=3)
+    args = parser.parse_args()
+
+    server = FakePigpiod(latency=args.latency_ms / 1000.0).start()
+    worker = IOWorker(PigpioConnection('127.0.0.1', server.port), maxsize=args.devices,
+                      report=report_inline).start()
+
+    waits = []
+    done = threading.Event()
+    submitted = [0]
+    completed = [0]
+
+    def on_done(key, error, t_submit):
+        waits.append(perf_counter() - t_submit)
+        completed[0] += 1
+        if completed[0] == submitted[0] and submitted[0] == args.commands:
+            done.set()
+
+    start = perf_counter()
+    for i in range(args.commands):
+        t_submit = perf_counter()
+        key = f"dev{i % args.devices}"
+        worker.submit(key, [(CMD_PWM, 20 + i % args.devices, i % 256)],
+                      lambda key, error, t=t_submit: on_done(key, error, t))
+        submitted[0] += 1
+        if (i + 1) % args.burst == 0:
+            sleep(0.001)
+    if completed[0] == args.commands:
+        done.set()
+    done.wait(60)
+    elapsed = perf_counter() - start
+    worker.stop()
+    server.stop()
+
+    sent = server.commands
+    print(f"submitted  {args.commands} commands in {elapsed * 1000:.1f} ms")
+    print(f"sent       {sent} to pigpiod ({worker.coalesced} coalesced)")
+    print(f"throughput {args.commands / elapsed:,.0f} submits/s, {sent / elapsed:,.0f} sends/s")
+    ms = [w * 1000 for w in waits]
+    print(f"queue+I/O  median {statistics.median(ms):.3f} ms   p99 {percentile(ms, 99):.3f} ms   "
+          f"max {max(ms):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
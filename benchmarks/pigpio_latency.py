@@ -0,0 +1,75 @@
+# Latency of pigpio writes against the local fake pigpiod with a simulated
+# Wi-Fi round-trip: serial per-command round-trips versus one pipelined batch
+# on a persistent pooled connection, plus recovery time after a dropped link.
+#
+#   python benchmarks/pigpio_latency.py [--rtt-ms 8] [--batch 3] [--rounds 50]
+import argparse
+import os
+import statistics
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_pigpiod import FakePigpiod  # noqa: E402
+from gpio import CMD_WRITE, PigpioConnection, PigpioPool  # noqa: E402
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = perf_counter()
+        fn()
+        samples.append((perf_counter() - start) * 1000)
+    return samples
+
+
+def show(name, samples):
+    print(f"{name:28s} median {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rtt-ms', type=float, default=8.0)
+    parser.add_argument('--batch', type=int, default=3,
+                        help='commands per flush; 3 is a "stop All" step')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    server = FakePigpiod(latency=args.rtt_ms / 1000.0).start()
+    commands = [(CMD_WRITE, 22 + i, 0) for i in range(args.batch)]
+
+    def reconnect_each_time():
+        conn = PigpioConnection('127.0.0.1', server.port)
+        for command in commands:
+            conn.command(*command)
+        conn.close()
+
+    conn = PigpioConnection('127.0.0.1', server.port)
+
+    def serial():
+        for command in commands:
+            conn.command(*command)
+
+    pool = PigpioPool('127.0.0.1', server.port, size=1, backoff=0.01)
+
+    def pipelined():
+        pool.pipeline(commands)
+
+    def after_drop():
+        server.drop_clients()
+        pool.pipeline(commands)
+
+    print(f"{args.batch} writes per flush, simulated RTT {args.rtt_ms} ms")
+    show('connect per flush, serial', timed(reconnect_each_time, args.rounds))
+    show('persistent, serial', timed(serial, args.rounds))
+    show('pooled, pipelined', timed(pipelined, args.rounds))
+    show('pooled, after link drop', timed(after_drop, max(1, args.rounds // 5)))
+    print(f"server saw {server.commands} commands over {server.connections} connections")
+    conn.close()
+    pool.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
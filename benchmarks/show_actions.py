@@ -0,0 +1,72 @@
+# Time to open ShowActionsScreen with a long generated program: screen
+# construction, then time until the first frame showing it is drawn.
+#
+#   python benchmarks/show_actions.py [--actions 10000]
+import argparse
+import os
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+
+def generated_actions(count):
+    pattern = [
+        {'type': 'start', 'device': 'Steam', 'level': 'min'},
+        {'type': 'delay', 'amount': 5, 'unit': 'sec'},
+        {'type': 'stop', 'device': 'Steam'},
+        {'type': 'delay', 'amount': 1, 'unit': 'min'},
+    ]
+    return [dict(pattern[i % len(pattern)]) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actions', type=int, default=10000)
+    args = parser.parse_args()
+    os.chdir(ROOT)
+
+    import main as app_main
+    from kivy.app import App
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+    from kivy.uix.screenmanager import NoTransition, ScreenManager
+
+    actions = {'C1': generated_actions(args.actions), 'C2': [], 'C3': []}
+    timings = {}
+
+    class BenchApp(App):
+        def build(self):
+            return ScreenManager(transition=NoTransition())
+
+        def on_start(self):
+            Clock.schedule_once(self.open_screen, 0.5)
+
+        def open_screen(self, dt):
+            start = perf_counter()
+            screen = app_main.ShowActionsScreen(actions, name='show_actions')
+            timings['construct'] = perf_counter() - start
+            self.root.add_widget(screen)
+            self.root.current = 'show_actions'
+
+            def on_flip(*args):
+                Window.unbind(on_flip=on_flip)
+                timings['first_frame'] = perf_counter() - start
+                timings['rows'] = len(screen.actions_view.layout_manager.children)
+                Clock.schedule_once(lambda dt: self.stop(), 0)
+
+            Window.bind(on_flip=on_flip)
+
+    BenchApp().run()
+    # An empty list would time a frame with nothing in it
+    assert timings['rows'] > 0, "no action rows are visible"
+    print(f"{args.actions} actions")
+    print(f"construct    {timings['construct'] * 1000:8.1f} ms")
+    print(f"first frame  {timings['first_frame'] * 1000:8.1f} ms")
+    print(f"row widgets  {timings['rows']:8d}")
+
+
+if __name__ == '__main__':
+    main()
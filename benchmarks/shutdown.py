@@ -0,0 +1,78 @@
+# Time from pressing OFF until every output reads low on the local fake
+# pigpiod with a simulated Wi-Fi round-trip. "busy" presses OFF while the I/O
+# worker is in the middle of sending a start batch, the worst case for the
+# stops; "worker only" is the same press with the stops queued behind that
+# batch on the worker alone, as a baseline.
+#
+#   python benchmarks/shutdown.py [--rtt-ms 8] [--rounds 50]
+import argparse
+import os
+import statistics
+import sys
+from time import perf_counter, sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from devices import DeviceController  # noqa: E402
+from fake_pigpiod import FakePigpiod  # noqa: E402
+from gpio import PigpioPool  # noqa: E402
+from io_worker import IOWorker  # noqa: E402
+from settings import DEFAULTS  # noqa: E402
+from shutdown import OutputTeardown  # noqa: E402
+
+# Device pins on the fake pigpiod
+PINS = {'Steam': 22, 'Hotwater': 23, 'Vacuum': 24}
+
+
+def report_inline(callback, key, error):
+    callback(key, error)
+
+
+def all_low(server, pins):
+    return all(server.levels.get(pin, 0) == 0 for pin in pins)
+
+
+def press_off(server, pool, pins, busy, direct):
+    worker = IOWorker(pool, report=report_inline).start()
+    devices = DeviceController(worker, pins, DEFAULTS['levels'])
+    pool.pipeline([command for name in pins for command in devices.commands(name, 'max')])
+    if busy:
+        # A start batch is on the wire when OFF is pressed
+        devices.set('All', 'max')
+        sleep(0.001)
+    start = perf_counter()
+    if direct:
+        teardown = OutputTeardown(pool, devices, worker).start()
+    else:
+        devices.stop_all()
+    while not all_low(server, pins.values()):
+        sleep(0.0002)
+    elapsed = perf_counter() - start
+    if direct:
+        teardown.wait(2.0)
+    else:
+        worker.stop(timeout=2.0)
+    # Nothing still in flight may turn an output back on
+    assert all_low(server, pins.values()), server.levels
+    return elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rtt-ms', type=float, default=8.0)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    server = FakePigpiod(latency=args.rtt_ms / 1000.0).start()
+    pool = PigpioPool('127.0.0.1', server.port, size=2, backoff=0.01)
+    pins = PINS
+    for name, busy, direct in (('idle', False, True), ('busy', True, True), ('busy, worker only', True, False)):
+        samples = [press_off(server, pool, pins, busy, direct) for _ in range(args.rounds)]
+        print(f"{name:20s} median {statistics.median(samples):7.2f} ms   worst {max(samples):7.2f} ms")
+    pool.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
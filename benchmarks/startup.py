@@ -0,0 +1,75 @@
+# Boot latency of the touch UI: import time, MyApp.build time and
+# time-to-first-frame. Each run is a fresh interpreter so imports are cold.
+#
+#   python benchmarks/startup.py [--runs N] [--no-prewarm]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(prewarm):
+    t0 = perf_counter()
+    import main
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+    t_import = perf_counter()
+
+    timings = {'import': t_import - t0}
+    app = main.MyApp()
+    app.prewarm_screens = prewarm
+    build = app.build
+
+    def timed_build():
+        start = perf_counter()
+        root = build()
+        timings['build'] = perf_counter() - start
+        return root
+
+    def on_flip(*args):
+        Window.unbind(on_flip=on_flip)
+        timings['first_frame'] = perf_counter() - t0
+        # Leave a few frames for pre-warming so its cost shows up in the log
+        Clock.schedule_once(lambda dt: app.stop(), 0.5)
+
+    app.build = timed_build
+    Window.bind(on_flip=on_flip)
+    app.run()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-prewarm', action='store_true')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    if args.child:
+        sys.path.insert(0, ROOT)
+        os.environ['KIVY_NO_ARGS'] = '1'
+        print(json.dumps(measure(not args.no_prewarm)))
+        return
+
+    results = []
+    for _ in range(args.runs):
+        cmd = [sys.executable, os.path.abspath(__file__), '--child']
+        if args.no_prewarm:
+            cmd.append('--no-prewarm')
+        out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    for key in ('import', 'build', 'first_frame'):
+        values = [r[key] * 1000 for r in results]
+        print(f"{key:12s} median {statistics.median(values):8.1f} ms   "
+              f"min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Live boiler temperature trend. The heater's sample buffer is read as a
+# bounded, evenly decimated snapshot, reduced to one point per pixel column
+# with Largest-Triangle-Three-Buckets and drawn by updating the points of a
+# single Line; the canvas instructions are created once.
+import numpy as np
+
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, Rectangle
+from kivy.uix.widget import Widget
+
+# Snapshot size per pixel column handed to LTTB. Bounds the redraw cost
+# whatever the history length; finer than this only feeds LTTB samples
+# that land in the same column.
+OVERSAMPLE = 4
+# Smallest vertical span shown, in degrees C, so sensor noise stays flat
+MIN_SPAN = 5.0
+
+
+def lttb(y, threshold):
+    # Indices of `threshold` samples of evenly spaced `y` chosen by
+    # Largest-Triangle-Three-Buckets: the first and last samples, then per
+    # bucket the one spanning the largest triangle with its neighbours.
+    # Fully vectorised: the neighbours are the means of the previous and next
+    # buckets, rather than the point chosen in the previous bucket as in the
+    # sequential algorithm, so no Python loop runs per bucket.
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    buckets = threshold - 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.intp)
+    starts = edges[:-1]
+    sizes = np.diff(edges)
+    x = np.arange(n, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mean_x = np.add.reduceat(x[1:n - 1], starts - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], starts - 1) / sizes
+    # Neighbour anchors of each bucket: previous and next bucket means, the
+    # first and last samples at the ends
+    ax = np.concatenate(([x[0]], mean_x[:-1]))
+    ay = np.concatenate(([y[0]], mean_y[:-1]))
+    cx = np.concatenate((mean_x[1:], [x[-1]]))
+    cy = np.concatenate((mean_y[1:], [y[-1]]))
+    bucket = np.repeat(np.arange(buckets), sizes)
+    px = x[1:n - 1]
+    py = y[1:n - 1]
+    area = np.abs((ax[bucket] - cx[bucket]) * (py - ay[bucket]) - (ax[bucket] - px) * (cy[bucket] - ay[bucket]))
+    best = np.maximum.reduceat(area, starts - 1)
+    # First sample reaching its bucket's largest area
+    hits = np.flatnonzero(area == best[bucket])
+    _, first = np.unique(bucket[hits], return_index=True)
+    return np.concatenate(([0], hits[first] + 1, [n - 1]))
+
+
+class TrendChart(Widget):
+    # Temperature history of a HeaterController's SampleRing, scaled to the
+    # samples shown with at least MIN_SPAN degrees of height
+    def __init__(self, samples, interval=1.0, **kwargs):
+        super(TrendChart, self).__init__(**kwargs)
+        self.samples = samples
+        self.interval = interval
+        self.event = None
+        with self.canvas:
+            Color(0, 0, 0, 0.25)
+            self.background = Rectangle(pos=self.pos, size=self.size)
+            Color(1, 1, 1, 1)
+            self.line = Line(points=[], width=1.2)
+        self.bind(pos=self.on_geometry, size=self.on_geometry)
+
+    def on_geometry(self, *args):
+        self.background.pos = self.pos
+        self.background.size = self.size
+        self.refresh()
+
+    def start(self):
+        if self.event is None:
+            self.event = Clock.schedule_interval(self.refresh, self.interval)
+        self.refresh()
+        return self.event
+
+    def stop(self):
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+
+    def refresh(self, *args):
+        columns = int(self.width)
+        snapshot = self.samples.snapshot(columns * OVERSAMPLE)
+        y = np.frombuffer(snapshot.temperature, dtype=np.float32)
+        if len(y) < 2 or columns < 3:
+            self.line.points = []
+            return
+        keep = lttb(y, columns)
+        low = float(y.min())
+        high = float(y.max())
+        if high - low < MIN_SPAN:
+            middle = (high + low) / 2
+            low, high = middle - MIN_SPAN / 2, middle + MIN_SPAN / 2
+        points = np.empty(2 * len(keep), dtype=np.float64)
+        points[0::2] = self.x + keep * ((self.width - 1) / (len(y) - 1))
+        points[1::2] = self.y + (y[keep] - low) * ((self.height - 1) / (high - low))
+        self.line.points = points.tolist()
@@ -4,27 +4,286 @@ from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.spinner import Spinner
 from kivy.uix.textinput import TextInput
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.popup import Popup
 from kivy.uix.filechooser import FileChooserIconView  # Ensure this import is present
 from kivy.core.window import Window
+from kivy.graphics import Color, Line
+from kivy.metrics import dp
+from kivy_garden.drag_n_drop import DraggableController, DraggableLayoutBehavior, DraggableObjectBehavior
 import yaml
 import os
 
+from programs import parse_program, save_programs
+from step_model import History, ProgramModel
+
+class DragHandle(DraggableObjectBehavior, Label):
+    # Grip at the start of each row; dragging it previews the whole row
+    def __init__(self, row, **kwargs):
+        super(DragHandle, self).__init__(text='::', size_hint_x=0.05, drag_cls='brick',
+                                         drag_widget=row, **kwargs)
+        self.row = row
+        self.step_uid = None
+
+    def initiate_drag(self):
+        # The row may be recycled for another step while it is dragged, so
+        # remember which step the drag started on
+        self.step_uid = self.row.step_uid
+
+class BrickLayout(DraggableLayoutBehavior, RecycleBoxLayout):
+    # Recycled brick list that accepts dropped rows. Rows are views of the
+    # model, so instead of inserting a spacer widget the drop position is
+    # shown as a line, and a drop becomes a single model move.
+    def __init__(self, **kwargs):
+        super(BrickLayout, self).__init__(drag_classes=['brick'], **kwargs)
+        self.drop_index = None
+        self.canvas.after.add(Color(1, 1, 1, 0.8))
+        self.drop_line = Line(points=[], width=dp(1.5))
+        self.canvas.after.add(self.drop_line)
+
+    def index_at(self, y):
+        # Gap between rows nearest to y; every row has the default height
+        count = len(self.recycleview.data)
+        index = int((self.top - y) / self.default_size[1] + 0.5)
+        return max(0, min(index, count))
+
+    def show_drop(self, index):
+        self.drop_index = index
+        if index is None:
+            self.drop_line.points = []
+        else:
+            y = self.top - index * self.default_size[1]
+            self.drop_line.points = [self.x, y, self.right, y]
+
+    def get_drop_insertion_index_move(self, x, y):
+        self.show_drop(self.index_at(y))
+        return None
+
+    def get_drop_insertion_index_up(self, x, y):
+        self.show_drop(None)
+        return self.index_at(y)
+
+    def on_touch_move(self, touch):
+        handled = super(BrickLayout, self).on_touch_move(touch)
+        if self.drop_index is not None and self._touch_uid() not in touch.ud:
+            # The drag left the list
+            self.show_drop(None)
+        return handled
+
+    def handle_drag_release(self, index, drag_widget):
+        App.get_running_app().drop_brick(drag_widget.step_uid, index)
+
+class BrickRow(RecycleDataViewBehavior, BoxLayout):
+    # Recycled row showing one step of the program. The row is reused for
+    # whatever step scrolls into its slot, so it keeps no state besides the
+    # uid of the step it currently shows; edits go straight to the model.
+    def __init__(self, **kwargs):
+        super(BrickRow, self).__init__(orientation='horizontal', **kwargs)
+        self.step_uid = None
+
+    def add_handle(self):
+        self.add_widget(DragHandle(self, drag_controller=App.get_running_app().drag_controller))
+
+    def add_controls(self):
+        # Remove Brick Button
+        remove_btn = Button(text='Remove', size_hint_x=0.1)
+        remove_btn.bind(on_press=lambda x: App.get_running_app().remove_brick(self.step_uid))
+        self.add_widget(remove_btn)
+
+        # Move Up Button
+        up_btn = Button(text='Up', size_hint_x=0.1)
+        up_btn.bind(on_press=lambda x: App.get_running_app().move_brick(self.step_uid, 'up'))
+        self.add_widget(up_btn)
+
+        # Move Down Button
+        down_btn = Button(text='Down', size_hint_x=0.1)
+        down_btn.bind(on_press=lambda x: App.get_running_app().move_brick(self.step_uid, 'down'))
+        self.add_widget(down_btn)
+
+    def refresh_view_attrs(self, rv, index, data):
+        # Callbacks are muted (uid None) while the widgets are repopulated
+        self.step_uid = None
+        self.show_step(App.get_running_app().model.get(data['uid']))
+        self.step_uid = data['uid']
+
+    def update_step(self, **fields):
+        if self.step_uid is not None:
+            App.get_running_app().model.update(self.step_uid, **fields)
+
+class StartStopBrick(BrickRow):
+    def __init__(self, **kwargs):
+        super(StartStopBrick, self).__init__(**kwargs)
+        self.add_handle()
+
+        # Action Spinner
+        self.action_spinner = Spinner(text='Select Type', values=('start', 'stop'), size_hint_x=0.2)
+        self.action_spinner.bind(text=self.on_action_change)
+        self.add_widget(self.action_spinner)
+
+        # Device Spinner
+        self.device_spinner = Spinner(text='Select Device', values=('Steam', 'Hotwater', 'Vacuum', 'All'), size_hint_x=0.3)
+        self.device_spinner.bind(text=lambda spinner, text: self.update_step(device=text))
+        self.add_widget(self.device_spinner)
+
+        # Level Spinner
+        self.level_spinner = Spinner(text='Select Level', values=('Min', 'Med', 'Max'), size_hint_x=0.3)
+        self.level_spinner.bind(text=lambda spinner, text: self.update_step(level=text.lower()))
+        self.add_widget(self.level_spinner)
+
+        self.add_controls()
+
+    def show_step(self, step):
+        self.action_spinner.text = step.action.capitalize() if step.action else 'Select Type'
+        self.device_spinner.text = step.device or 'Select Device'
+        self.level_spinner.text = step.level.capitalize() if step.level else 'Select Level'
+        self.show_level(step.action)
+
+    def show_level(self, action):
+        # The level only applies to "start"; hide and disable it otherwise
+        self.level_spinner.opacity = 1 if action == 'start' else 0
+        self.level_spinner.disabled = action != 'start'
+
+    def on_action_change(self, spinner, text):
+        action = text.lower() if text.lower() in ('start', 'stop') else None
+        self.show_level(action)
+        self.update_step(action=action)
+
+class DelayBrick(BrickRow):
+    def __init__(self, **kwargs):
+        super(DelayBrick, self).__init__(**kwargs)
+        self.add_handle()
+
+        # Delay Time Input
+        self.delay_input = TextInput(hint_text='Delay (0-1000)', size_hint_x=0.2, input_filter='int')
+        self.delay_input.bind(text=lambda field, text: self.update_step(amount=int(text) if text.isdigit() else None))
+        self.add_widget(self.delay_input)
+
+        # Time Type Spinner (Seconds/Minutes)
+        self.time_type_spinner = Spinner(text='Seconds/Minutes', values=('Seconds', 'Minutes'), size_hint_x=0.3)
+        self.time_type_spinner.bind(text=lambda spinner, text: self.update_step(unit='sec' if text == 'Seconds' else 'min'))
+        self.add_widget(self.time_type_spinner)
+
+        # Blank Field to maintain size consistency
+        self.add_widget(Label(size_hint_x=0.3))
+
+        self.add_controls()
+
+    def show_step(self, step):
+        self.delay_input.text = '' if step.amount is None else str(step.amount)
+        self.time_type_spinner.text = {'sec': 'Seconds', 'min': 'Minutes'}.get(step.unit, 'Seconds/Minutes')
+
+class RepeatBrick(BrickRow):
+    # Opens a block run `amount` times, up to the matching End brick
+    def __init__(self, **kwargs):
+        super(RepeatBrick, self).__init__(**kwargs)
+        self.add_handle()
+
+        self.add_widget(Label(text='Repeat', size_hint_x=0.2))
+
+        # Repeat count input
+        self.times_input = TextInput(hint_text='Times', size_hint_x=0.3, input_filter='int')
+        self.times_input.bind(text=lambda field, text: self.update_step(amount=int(text) if text.isdigit() else None))
+        self.add_widget(self.times_input)
+
+        self.add_widget(Label(text='times', size_hint_x=0.3))
+
+        self.add_controls()
+
+    def show_step(self, step):
+        self.times_input.text = '' if step.amount is None else str(step.amount)
+
+class DefineBrick(BrickRow):
+    # Opens a named subroutine, up to the matching End brick
+    def __init__(self, **kwargs):
+        super(DefineBrick, self).__init__(**kwargs)
+        self.add_handle()
+
+        self.add_widget(Label(text='Subroutine', size_hint_x=0.2))
+
+        # Subroutine name input
+        self.name_input = TextInput(hint_text='Name', size_hint_x=0.3, multiline=False)
+        self.name_input.bind(text=lambda field, text: self.update_step(name=text.strip() or None))
+        self.add_widget(self.name_input)
+
+        # Blank Field to maintain size consistency
+        self.add_widget(Label(size_hint_x=0.3))
+
+        self.add_controls()
+
+    def show_step(self, step):
+        self.name_input.text = step.name or ''
+
+class CallBrick(BrickRow):
+    def __init__(self, **kwargs):
+        super(CallBrick, self).__init__(**kwargs)
+        self.add_handle()
+
+        self.add_widget(Label(text='Call', size_hint_x=0.2))
+
+        # Name of the subroutine to run
+        self.name_input = TextInput(hint_text='Subroutine name', size_hint_x=0.3, multiline=False)
+        self.name_input.bind(text=lambda field, text: self.update_step(name=text.strip() or None))
+        self.add_widget(self.name_input)
+
+        # Blank Field to maintain size consistency
+        self.add_widget(Label(size_hint_x=0.3))
+
+        self.add_controls()
+
+    def show_step(self, step):
+        self.name_input.text = step.name or ''
+
+class EndBrick(BrickRow):
+    # Closes the innermost open Repeat or Subroutine block
+    def __init__(self, **kwargs):
+        super(EndBrick, self).__init__(**kwargs)
+        self.add_handle()
+        self.add_widget(Label(text='End', size_hint_x=0.8))
+        self.add_controls()
+
+    def show_step(self, step):
+        pass
+
+BRICK_VIEWS = {
+    'start_stop': 'StartStopBrick',
+    'delay': 'DelayBrick',
+    'repeat': 'RepeatBrick',
+    'define': 'DefineBrick',
+    'call': 'CallBrick',
+    'end': 'EndBrick',
+}
+
 class ConfigBuilderApp(App):
+    # Undo history limits: number of entries and estimated memory
+    history_depth = 200
+    history_max_bytes = 4 * 1024 * 1024
+
     def build(self):
         Window.size = (1200, 900)  # Set fixed size
         Window.allow_resize = False  # Disallow resizing
         self.root = BoxLayout(orientation='vertical')
 
-        # Brick container inside ScrollView
-        self.brick_container = BoxLayout(orientation='vertical', size_hint_y=None)
+        # Program being edited; the bricks are views of its steps
+        self.history = History(self.history_depth, self.history_max_bytes)
+        self.model = ProgramModel(self.history)
+        self.model.listeners.append(self.on_model_change)
+        Window.bind(on_keyboard=self.on_keyboard)
+
+        # Recycled brick list: only rows on screen exist as widgets, however
+        # long the program is. Dragging the content would fight with dragging
+        # rows, so the list scrolls with its bar and the mouse wheel.
+        self.drag_controller = DraggableController()
+        self.brick_view = RecycleView(size_hint=(1, 1), scroll_type=['bars'], bar_width=dp(10))
+        self.brick_container = BrickLayout(orientation='vertical', size_hint_y=None,
+                                                default_size=(None, dp(40)), default_size_hint=(1, None))
         self.brick_container.bind(minimum_height=self.brick_container.setter('height'))
-
-        # ScrollView to handle bricks
-        scroll = ScrollView(size_hint=(1, 1))
-        scroll.add_widget(self.brick_container)
-        self.root.add_widget(scroll)
+        self.brick_view.add_widget(self.brick_container)
+        # Rows name their brick class in 'viewclass'; the layout manager has
+        # to exist before this is set
+        self.brick_view.key_viewclass = 'viewclass'
+        self.root.add_widget(self.brick_view)
 
         # Button to add start/stop brick
         add_start_stop_btn = Button(text='Add Start/Stop Brick', size_hint_y=None, height='40dp')
@@ -36,6 +295,29 @@ class ConfigBuilderApp(App):
         add_delay_btn.bind(on_press=lambda x: self.add_brick('delay'))
         self.root.add_widget(add_delay_btn)
 
+        # Buttons to add repeat and subroutine blocks and calls
+        block_row = BoxLayout(orientation='horizontal', size_hint_y=None, height='40dp')
+        add_repeat_btn = Button(text='Add Repeat Block')
+        add_repeat_btn.bind(on_press=lambda x: self.add_block('repeat'))
+        block_row.add_widget(add_repeat_btn)
+        add_define_btn = Button(text='Add Subroutine')
+        add_define_btn.bind(on_press=lambda x: self.add_block('define'))
+        block_row.add_widget(add_define_btn)
+        add_call_btn = Button(text='Add Call')
+        add_call_btn.bind(on_press=lambda x: self.add_brick('call'))
+        block_row.add_widget(add_call_btn)
+        self.root.add_widget(block_row)
+
+        # Undo/Redo buttons
+        history_row = BoxLayout(orientation='horizontal', size_hint_y=None, height='40dp')
+        undo_btn = Button(text='Undo')
+        undo_btn.bind(on_press=lambda x: self.undo())
+        history_row.add_widget(undo_btn)
+        redo_btn = Button(text='Redo')
+        redo_btn.bind(on_press=lambda x: self.redo())
+        history_row.add_widget(redo_btn)
+        self.root.add_widget(history_row)
+
         # Button to load configuration
         load_btn = Button(text='Load Config', size_hint_y=None, height='40dp')
         load_btn.bind(on_press=self.show_load_popup)
@@ -48,90 +330,68 @@ class ConfigBuilderApp(App):
 
         return self.root
 
-    def add_brick(self, brick_type):
-        brick = BoxLayout(orientation='horizontal', size_hint_y=None, height='40dp')
-        brick.brick_type = brick_type  # Adding type attribute to identify the brick type later
-
-        if brick_type == 'start_stop':
-            # Action Spinner
-            action_spinner = Spinner(text='Select Type', values=('start', 'stop'), size_hint_x=0.2)
-            brick.add_widget(action_spinner)
-            action_spinner.widget_type = 'action_spinner'
-
-            # Device Spinner
-            device_spinner = Spinner(text='Select Device', values=('Steam', 'Hotwater', 'Vacuum', 'All'), size_hint_x=0.3)
-            brick.add_widget(device_spinner)
-            device_spinner.widget_type = 'device_spinner'
-
-            # Level Spinner
-            level_spinner = Spinner(text='Select Level', values=('Min', 'Med', 'Max'), size_hint_x=0.3)
-            brick.add_widget(level_spinner)
-            level_spinner.widget_type = 'level_spinner'
-
-            # Initially hide and disable the level_spinner since "Select Type" is not "start"
-            level_spinner.opacity = 0
-            level_spinner.disabled = True
-
-            # Define a callback to show/hide and enable/disable level_spinner based on action selection
-            def on_action_change(spinner, text):
-                if text.lower() == 'start':
-                    level_spinner.opacity = 1
-                    level_spinner.disabled = False
-                elif text.lower() == 'stop':
-                    level_spinner.opacity = 0
-                    level_spinner.disabled = True
-                else:
-                    # For "Select Type" or any other unexpected value
-                    level_spinner.opacity = 0
-                    level_spinner.disabled = True
-
-            # Bind the callback to the action_spinner
-            action_spinner.bind(text=on_action_change)
-
-        elif brick_type == 'delay':
-            # Delay Time Input
-            delay_input = TextInput(hint_text='Delay (0-1000)', size_hint_x=0.2, input_filter='int')
-            brick.add_widget(delay_input)
-            delay_input.widget_type = 'delay_input'
-
-            # Time Type Spinner (Seconds/Minutes)
-            time_type_spinner = Spinner(text='Seconds/Minutes', values=('Seconds', 'Minutes'), size_hint_x=0.3)
-            brick.add_widget(time_type_spinner)
-            time_type_spinner.widget_type = 'time_type_spinner'
-
-            # Blank Field to maintain size consistency
-            blank_field = Label(size_hint_x=0.3)
-            brick.add_widget(blank_field)
+    def row_data(self, step):
+        return {'viewclass': BRICK_VIEWS[step.kind], 'uid': step.uid}
+
+    def on_model_change(self, kind, position, other):
+        # Keep the recycled list's data in step with the model's structure
+        data = self.brick_view.data
+        if kind == 'insert':
+            data.insert(position, self.row_data(self.model[position]))
+        elif kind == 'remove':
+            del data[position]
+        elif kind == 'swap':
+            data[position], data[other] = data[other], data[position]
+        elif kind == 'move':
+            # Rotate the affected slice in one assignment, so the view only
+            # refreshes the rows between the two positions
+            lo, hi = min(position, other), max(position, other)
+            rows = data[lo:hi + 1]
+            data[lo:hi + 1] = rows[1:] + rows[:1] if position < other else rows[-1:] + rows[:-1]
+        elif kind == 'load':
+            self.brick_view.data = [self.row_data(step) for step in self.model]
 
-        # Remove Brick Button
-        remove_btn = Button(text='Remove', size_hint_x=0.1, size_hint_y=None, height='40dp')
-        remove_btn.bind(on_press=lambda x: self.remove_brick(brick))
-        brick.add_widget(remove_btn)
-
-        # Move Up Button
-        up_btn = Button(text='Up', size_hint_x=0.1, size_hint_y=None, height='40dp')
-        up_btn.bind(on_press=lambda x: self.move_brick(brick, 'up'))
-        brick.add_widget(up_btn)
-
-        # Move Down Button
-        down_btn = Button(text='Down', size_hint_x=0.1, size_hint_y=None, height='40dp')
-        down_btn.bind(on_press=lambda x: self.move_brick(brick, 'down'))
-        brick.add_widget(down_btn)
-
-        self.brick_container.add_widget(brick)
-
-    def remove_brick(self, brick):
-        if self.brick_container:  # Ensure brick_container still exists
-            self.brick_container.remove_widget(brick)
-
-    def move_brick(self, brick, direction):
-        index = self.brick_container.children.index(brick)
-        if direction == 'up' and index < len(self.brick_container.children) - 1:
-            self.brick_container.remove_widget(brick)
-            self.brick_container.add_widget(brick, index=index + 1)
-        elif direction == 'down' and index > 0:
-            self.brick_container.remove_widget(brick)
-            self.brick_container.add_widget(brick, index=index - 1)
+    def add_brick(self, brick_type):
+        self.model.append(self.model.new_step(brick_type))
+
+    def add_block(self, kind):
+        # A block is added with its End brick; steps go between the two
+        self.model.append(self.model.new_step(kind))
+        self.model.append(self.model.new_step('end'))
+
+    def remove_brick(self, uid):
+        self.model.remove(uid)
+
+    def move_brick(self, uid, direction):
+        self.model.swap(uid, -1 if direction == 'up' else 1)
+
+    def drop_brick(self, uid, index):
+        # `index` is the gap the row was dropped in, counted before the move
+        if uid is not None:
+            position = self.model.position(uid)
+            self.model.move(uid, index - 1 if index > position else index)
+
+    def undo(self):
+        if self.history.undo(self.model):
+            # Field edits do not change the data list, so repopulate the rows
+            self.brick_view.refresh_from_data()
+
+    def redo(self):
+        if self.history.redo(self.model):
+            self.brick_view.refresh_from_data()
+
+    def on_keyboard(self, window, key, scancode, codepoint, modifiers):
+        if 'ctrl' in modifiers and codepoint == 'z':
+            self.redo() if 'shift' in modifiers else self.undo()
+            return True
+        if 'ctrl' in modifiers and codepoint == 'y':
+            self.redo()
+            return True
+        return False
+
+    def load_program(self, filepath):
+        actions = parse_program(filepath)
+        self.model.load_actions(actions)
 
     def show_save_popup(self, instance):
         content = BoxLayout(orientation='vertical', padding=10, spacing=10)
@@ -179,35 +439,10 @@ class ConfigBuilderApp(App):
             popup.dismiss()
             return
 
-        with open(filepath, 'r') as infile:
-            config = yaml.safe_load(infile)
-
-        self.brick_container.clear_widgets()  # Clear existing bricks
-
-        for action in config.get('actions', []):
-            if action['type'] == 'delay':
-                self.add_brick('delay')
-                last_brick = self.brick_container.children[0]
-                delay_input = next((child for child in last_brick.children if getattr(child, 'widget_type', None) == 'delay_input'), None)
-                time_type_spinner = next((child for child in last_brick.children if getattr(child, 'widget_type', None) == 'time_type_spinner'), None)
-                if delay_input and time_type_spinner:
-                    delay_input.text = str(action['amount'])
-                    time_type_spinner.text = 'Seconds' if action['unit'] == 'sec' else 'Minutes'
-            elif action['type'] in ('start', 'stop'):
-                self.add_brick('start_stop')
-                last_brick = self.brick_container.children[0]
-                action_spinner = next((child for child in last_brick.children if getattr(child, 'widget_type', None) == 'action_spinner'), None)
-                device_spinner = next((child for child in last_brick.children if getattr(child, 'widget_type', None) == 'device_spinner'), None)
-                level_spinner = next((child for child in last_brick.children if getattr(child, 'widget_type', None) == 'level_spinner'), None)
-                if action_spinner and device_spinner:
-                    action_spinner.text = action['type'].capitalize()
-                    device_spinner.text = action['device']
-                    if level_spinner and action['type'] == 'start' and 'level' in action:
-                        level_spinner.text = action['level'].capitalize()
-                    else:
-                        # If type is 'stop', ensure level_spinner is hidden and disabled
-                        level_spinner.opacity = 0
-                        level_spinner.disabled = True
+        try:
+            self.load_program(filepath)
+        except (yaml.YAMLError, ValueError) as exc:
+            print(f"Configuration file {filepath} is invalid: {exc}")
 
         popup.dismiss()
 
@@ -218,43 +453,17 @@ class ConfigBuilderApp(App):
             os.makedirs('config')
         filepath = os.path.join('config', filename)
 
-        config = {'actions': []}
-
-        for brick in self.brick_container.children[::-1]:  # Iterate from top to bottom
-            if hasattr(brick, 'brick_type') and brick.brick_type == 'delay':
-                delay_input = next((child for child in brick.children if getattr(child, 'widget_type', None) == 'delay_input'), None)
-                time_type_spinner = next((child for child in brick.children if getattr(child, 'widget_type', None) == 'time_type_spinner'), None)
-                if delay_input and time_type_spinner:
-                    delay = delay_input.text
-                    time_type = time_type_spinner.text
-                    if delay.isdigit():
-                        unit = 'sec' if time_type == 'Seconds' else 'min'
-                        config['actions'].append({
-                            'type': 'delay',
-                            'amount': int(delay),
-                            'unit': unit
-                        })
-            elif hasattr(brick, 'brick_type') and brick.brick_type == 'start_stop':
-                action_spinner = next((child for child in brick.children if getattr(child, 'widget_type', None) == 'action_spinner'), None)
-                device_spinner = next((child for child in brick.children if getattr(child, 'widget_type', None) == 'device_spinner'), None)
-                level_spinner = next((child for child in brick.children if getattr(child, 'widget_type', None) == 'level_spinner'), None)
-                if action_spinner and device_spinner:
-                    action_type = action_spinner.text.lower()
-                    device = device_spinner.text.capitalize()
-                    level = level_spinner.text.lower() if level_spinner and action_type == 'start' else None
-                    action_data = {
-                        'type': action_type,
-                        'device': device
-                    }
-                    if level:
-                        action_data['level'] = level
-                    config['actions'].append(action_data)
-
-        # Save to YAML file
-        with open(filepath, 'w') as outfile:
-            yaml.dump(config, outfile, default_flow_style=False, sort_keys=False)
-
-        print(f"Configuration saved to {filepath}")
+        # Atomic write, skipped when the program did not change
+        try:
+            written = save_programs({filepath: self.model.to_actions()})
+        except ValueError as exc:
+            print(f"Configuration not saved, {exc}")
+            popup.dismiss()
+            return
+        if written:
+            print(f"Configuration saved to {filepath}")
+        else:
+            print(f"Configuration {filepath} unchanged")
         popup.dismiss()
 
 if __name__ == '__main__':
@@ -0,0 +1,80 @@
+from queue import Full
+
+from time import monotonic
+
+from kivy.logger import Logger
+
+import instrumentation
+
+from gpio import CMD_PWM, CMD_WRITE
+from sequence import ALL_DEVICES, expand_device
+from state import machine_state
+
+
+class DeviceController(object):
+    # Turns device start/stop requests into pigpio commands for the I/O
+    # worker and mirrors the requested state into machine_state.devices.
+    # When the worker reports a failed write, the device goes back to the
+    # last state the hardware acknowledged, unless a newer request has
+    # replaced it since.
+    # Must be called from the Kivy main thread.
+    def __init__(self, worker, pins, levels):
+        self.worker = worker
+        self.pins = pins
+        self.levels = levels
+        # Requests made per device, to tell a stale completion from the
+        # latest one, and the last level each device acknowledged
+        self.requests = {}
+        self.confirmed = {}
+
+    def commands(self, device, level):
+        pin = self.pins[device]
+        if level is None:
+            return [(CMD_WRITE, pin, 0)]
+        duty = self.levels.get(str(level).lower())
+        if duty is None:
+            Logger.warning(f"Devices: unknown level {level!r} for {device}, using max")
+            duty = self.levels['max']
+        return [(CMD_PWM, pin, duty)]
+
+    def set(self, device, level, callback=None):
+        # level None switches the device off; "All" goes out as one batch
+        self.set_devices(expand_device(device), level, callback)
+
+    def set_devices(self, devices, level, callback=None):
+        names = []
+        for name in devices:
+            if name in self.pins:
+                names.append(name)
+            else:
+                Logger.warning(f"Devices: no pin configured for {name!r}")
+        # Set while a traced button press is being handled
+        trace = instrumentation.current
+        if trace is not None:
+            trace.queue = monotonic()
+        requests = {name: self.requests.get(name, 0) + 1 for name in names}
+
+        def done(name, error):
+            if self.requests.get(name) == requests[name]:
+                if error is None:
+                    self.confirmed[name] = level
+                else:
+                    machine_state.devices[name] = self.confirmed.get(name)
+            if callback is not None:
+                callback(name, error)
+
+        try:
+            self.worker.submit_many([(name, self.commands(name, level)) for name in names], done, trace)
+        except Full as exc:
+            Logger.warning(f"Devices: dropped {', '.join(names)} command: {exc}")
+            return
+        self.requests.update(requests)
+        for name in names:
+            machine_state.devices[name] = level
+
+    def apply_step(self, step, callback=None):
+        self.set(step.device, step.level if step.action == 'start' else None, callback)
+
+    def stop_all(self, callback=None):
+        # Sent even for devices believed off, in case the hardware disagrees
+        self.set(ALL_DEVICES, None, callback)
@@ -0,0 +1,176 @@
+import heapq
+from itertools import count
+from time import monotonic
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+import eventlog
+from sequence import DEVICES, expand_device
+
+# Arbitration priorities: a higher priority takes devices away from a lower
+# one, equal priorities keep whoever claimed the device first
+PRIORITY_PROGRAM = 0
+PRIORITY_MANUAL = 10
+
+
+class Job(object):
+    # One running sequence. Steps are pulled one at a time from the
+    # timeline's generator; `pending` is the next one, None once all fired.
+    # Jobs are created and driven by a Scheduler.
+    def __init__(self, timeline, name, priority=PRIORITY_PROGRAM, on_finish=None):
+        self.timeline = timeline
+        self.name = name
+        self.priority = priority
+        self.on_finish = on_finish
+        self.started_at = None
+        self.steps = iter(timeline) if timeline is not None else iter(())
+        self.pending = next(self.steps, None)
+        self.running = False
+        # Devices taken by a higher priority; not handed back during this run
+        self.lost = set()
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return monotonic() - self.started_at
+
+    def next_due(self):
+        # Absolute time of the next step, or of the end of the program
+        if self.pending is not None:
+            return self.started_at + self.pending.offset
+        return self.started_at + self.timeline.duration
+
+    def advance(self):
+        step = self.pending
+        self.pending = next(self.steps, None)
+        return step
+
+
+class Scheduler(object):
+    # Runs any number of sequences at once on one shared timer: a heap of
+    # (due time, job) with a single Clock event for the earliest entry, so
+    # the cost of waiting does not grow with the number of running programs.
+    #
+    # Every device has at most one owner. A start step claims the devices it
+    # addresses ("All" means each of them) and a stop step by the owner
+    # releases them. A step on a device owned by another job is applied only
+    # if its job has a strictly higher priority, which preempts the owner;
+    # otherwise it is skipped for that device. Manual control runs as the
+    # `manual` job at PRIORITY_MANUAL.
+    #
+    # `apply(devices, level)` switches the granted devices (level None is
+    # off). Must be used from the Kivy main thread.
+    def __init__(self, apply):
+        self.apply = apply
+        self.owners = dict.fromkeys(DEVICES)
+        self.jobs = []
+        self.manual = Job(None, 'manual', PRIORITY_MANUAL)
+        self._heap = []
+        self._order = count()
+        self._event = None
+        self._event_due = None
+
+    def start(self, timeline, name, priority=PRIORITY_PROGRAM, on_finish=None):
+        job = Job(timeline, name, priority, on_finish)
+        job.started_at = monotonic()
+        job.running = True
+        self.jobs.append(job)
+        self._push(job)
+        return job
+
+    def cancel(self, job, stop=True):
+        # Ends a job early; the devices it owns are released, and switched
+        # off unless `stop` is False
+        if not job.running:
+            return
+        self._finish(job, stop)
+        # The heap entry is dropped lazily when it comes due
+        if not self.jobs:
+            self._heap = []
+            self._reschedule()
+
+    def cancel_all(self, stop=True):
+        for job in list(self.jobs):
+            self.cancel(job, stop)
+
+    def command(self, device, level):
+        # Manual start (level) or stop (None) of a device
+        self.dispatch(self.manual, 'start' if level is not None else 'stop', device, level)
+
+    def owner(self, device):
+        return self.owners.get(device)
+
+    def dispatch(self, job, action, device, level):
+        granted = []
+        for name in expand_device(device):
+            owner = self.owners.get(name, job)
+            if owner is job or owner is None:
+                if name in job.lost:
+                    continue
+            elif job.priority > owner.priority:
+                owner.lost.add(name)
+                Logger.info(f"Scheduler: {job.name} preempted {owner.name} on {name}")
+            else:
+                Logger.info(f"Scheduler: {job.name} {action} {name} skipped, owned by {owner.name}")
+                continue
+            if name in self.owners:
+                self.owners[name] = job if action == 'start' else None
+            granted.append(name)
+        if granted:
+            self.apply(tuple(granted), level if action == 'start' else None)
+        return granted
+
+    def _finish(self, job, stop):
+        job.running = False
+        self.jobs.remove(job)
+        owned = tuple(name for name, owner in self.owners.items() if owner is job)
+        for name in owned:
+            self.owners[name] = None
+        if stop and owned:
+            self.apply(owned, None)
+        if job.on_finish:
+            job.on_finish(job)
+
+    def _push(self, job):
+        due = job.next_due()
+        heapq.heappush(self._heap, (due, next(self._order), job))
+        if self._event_due is None or due < self._event_due:
+            self._reschedule()
+
+    def _reschedule(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+            self._event_due = None
+        if self._heap:
+            self._event_due = self._heap[0][0]
+            self._event = Clock.schedule_once(self._tick, max(0, self._event_due - monotonic()))
+
+    def _tick(self, dt):
+        self._event = None
+        self._event_due = None
+        now = monotonic()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, _, job = heapq.heappop(heap)
+            if not job.running:
+                continue
+            # Fire everything due, including steps sharing the same offset
+            while job.pending is not None and job.started_at + job.pending.offset <= now:
+                step = job.advance()
+                Logger.info(f"Sequence: {job.name} {step.action} {step.device} at {step.offset:.0f}s")
+                granted = self.dispatch(job, step.action, step.device, step.level)
+                if eventlog.log is not None:
+                    level = eventlog.level_code(step.level if step.action == 'start' else None)
+                    for name in granted:
+                        eventlog.record(eventlog.KIND_STEP, eventlog.device_code(name), level, step.offset)
+                if not job.running:
+                    break
+            if not job.running:
+                continue
+            if job.pending is not None or now < job.started_at + job.timeline.duration:
+                heapq.heappush(heap, (job.next_due(), next(self._order), job))
+            else:
+                self._finish(job, stop=False)
+        self._reschedule()
@@ -0,0 +1,442 @@
+# Durable event and telemetry log for service diagnostics: button presses,
+# sequence steps, GPIO commands, heater samples. Records are 16 bytes,
+# appended under a lock into a memory-mapped, preallocated segment file, so
+# logging costs a struct.pack_into on the calling thread and no syscall. A
+# background thread group-commits the written pages every
+# `commit_interval` seconds, keeps the next segment created ahead of time
+# so a full one is swapped out without file work on the calling thread,
+# and seals, compacts and rotates full segments.
+#
+# Layout: `<directory>/<seq>.seg` are raw segments of `segment_size` bytes
+# (zero-filled past the last record); the one being written is followed by
+# an empty spare.
+# Beyond `keep_raw` sealed segments, the oldest is compacted into
+# `<seq>.cmp`: every event is kept, heater samples are thinned to one per
+# `sample_interval` seconds. Compacted segments older than
+# `retention_days` or beyond `max_bytes` in total are deleted.
+#
+#   python eventlog.py [--dir logs/events] [--hours 24] [--kind press] [--device Steam] [--stats]
+import argparse
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+from time import time
+
+import numpy as np
+
+import storage
+from sequence import DEVICES
+
+# Segment header: magic, format version, record size, sequence number and
+# creation time, padded to 32 bytes
+HEADER = struct.Struct('<4sHHId12x')
+MAGIC = b'EVLG'
+VERSION = 1
+# Record: wall-clock time, kind, subject, code, value
+RECORD = struct.Struct('<dBBhf')
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('kind', 'u1'), ('subject', 'u1'), ('code', '<i2'), ('value', '<f4')])
+
+# Record kinds, with what subject, code and value hold
+KIND_PRESS = 1    # device index or SUBJECT_PROGRAM/SUBJECT_OFF, level code
+KIND_STEP = 2     # device index, level code, offset in the program (s)
+KIND_COMMAND = 3  # GPIO pin, pigpio command, command parameter
+KIND_ERROR = 4    # GPIO pin, pigpio result (-1 for a link error)
+KIND_SAMPLE = 5   # 0, heater output in permille, temperature (C)
+KIND_APP = 6      # 0, 1 started / 0 closed cleanly
+KINDS = {KIND_PRESS: 'press', KIND_STEP: 'step', KIND_COMMAND: 'command', KIND_ERROR: 'error',
+         KIND_SAMPLE: 'sample', KIND_APP: 'app'}
+
+# Level codes of press and step records; -1 is any other level
+LEVELS = (None, 'min', 'med', 'max')
+# Press subjects besides the device indexes: a program button is
+# SUBJECT_PROGRAM plus its number, with code 1 for start and 0 for cancel
+SUBJECT_PROGRAM = 100
+SUBJECT_OFF = 200
+COMMANDS = {4: 'write', 5: 'pwm', 86: 'hp'}
+
+# EventLog while logging is enabled
+log = None
+
+
+def level_code(level):
+    return LEVELS.index(level) if level in LEVELS else -1
+
+
+def device_code(device):
+    return DEVICES.index(device) if device in DEVICES else 255
+
+
+def program_code(name):
+    # 'C2' -> SUBJECT_PROGRAM + 2
+    return SUBJECT_PROGRAM + int(name[1:])
+
+
+def record(kind, subject=0, code=0, value=0.0):
+    # Appends a record when logging is enabled; one check when it is not
+    if log is not None:
+        log.append(kind, subject, code, value)
+
+
+def segment_path(directory, seq, compacted=False):
+    return os.path.join(directory, f"{seq:08d}.{'cmp' if compacted else 'seg'}")
+
+
+def list_segments(directory):
+    # (seq, path, compacted) in sequence order
+    segments = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            stem, _, extension = name.partition('.')
+            if stem.isdigit() and extension in ('seg', 'cmp'):
+                segments.append((int(stem), os.path.join(directory, name), extension == 'cmp'))
+    return sorted(segments)
+
+
+def read_records(path):
+    # Records of a raw or compacted segment as a numpy structured array; the
+    # zero-filled tail of a raw segment is cut off
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        return np.empty(0, RECORD_DTYPE)
+    count = (len(data) - HEADER.size) // RECORD.size
+    records = np.frombuffer(data, RECORD_DTYPE, count, HEADER.size)
+    return records[:np.count_nonzero(records['time'])]
+
+
+def last_time(path):
+    # Time of the last record of a compacted segment, which has no zero tail
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size + RECORD.size:
+            return 0.0
+        file.seek(size - RECORD.size)
+        return RECORD.unpack(file.read(RECORD.size))[0]
+
+
+class Segment(object):
+    # A raw segment file mapped into memory
+    def __init__(self, path, seq, file, mapped, offset):
+        self.path = path
+        self.seq = seq
+        self.file = file
+        self.map = mapped
+        # End of the records written so far
+        self.offset = offset
+
+    @classmethod
+    def create(cls, directory, seq, size):
+        path = segment_path(directory, seq)
+        file = open(path, 'w+b')
+        file.truncate(size)
+        mapped = mmap.mmap(file.fileno(), size)
+        mapped[:HEADER.size] = HEADER.pack(MAGIC, VERSION, RECORD.size, seq, time())
+        mapped.flush(0, HEADER.size)
+        storage.fsync_directory(directory)
+        return cls(path, seq, file, mapped, HEADER.size)
+
+    @classmethod
+    def open(cls, path, seq):
+        # Reopens a raw segment for appending after the last record, found
+        # by bisecting for the first zero timestamp; None if it is unusable
+        file = open(path, 'r+b')
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size + RECORD.size:
+            file.close()
+            return None
+        mapped = mmap.mmap(file.fileno(), size)
+        if mapped[:4] != MAGIC:
+            mapped.close()
+            file.close()
+            return None
+        low, high = 0, (size - HEADER.size) // RECORD.size
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<d', mapped, HEADER.size + middle * RECORD.size)[0]:
+                low = middle + 1
+            else:
+                high = middle
+        return cls(path, seq, file, mapped, HEADER.size + low * RECORD.size)
+
+    @property
+    def full(self):
+        return self.offset + RECORD.size > len(self.map)
+
+    def flush(self, start, end):
+        start -= start % mmap.PAGESIZE
+        if end > start:
+            self.map.flush(start, end - start)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class EventLog(object):
+    def __init__(self, directory, segment_size=4 << 20, commit_interval=1.0, keep_raw=4,
+                 sample_interval=10.0, retention_days=90, max_bytes=256 << 20):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.commit_interval = commit_interval
+        self.keep_raw = keep_raw
+        self.sample_interval = sample_interval
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.segment = None
+        # Empty segment that replaces the current one when it fills up
+        self.spare = None
+        self._next_seq = 1
+        # Offset in the current segment up to which pages were committed
+        self.committed = 0
+        # Full segments waiting for the commit thread to close them
+        self._sealed = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = list_segments(self.directory)
+        raw = [(seq, path) for seq, path, compacted in segments if not compacted]
+        if raw:
+            self.segment = Segment.open(raw[-1][1], raw[-1][0])
+        if self.segment is None or self.segment.full:
+            if self.segment is not None:
+                self.segment.close()
+            self.segment = Segment.create(self.directory, segments[-1][0] + 1 if segments else 1,
+                                          self.segment_size)
+        self.committed = self.segment.offset
+        self._next_seq = self.segment.seq + 1
+        self.maintain()
+        self.prepare_spare()
+        self._thread = threading.Thread(target=self._run, name='eventlog', daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, kind, subject=0, code=0, value=0.0, at=None):
+        with self.lock:
+            segment = self.segment
+            if segment is None:
+                # Closed; a thread may still hold the log it found enabled
+                return
+            if segment.full:
+                segment = self._rotate()
+            RECORD.pack_into(segment.map, segment.offset, at or time(), kind, subject, code, value)
+            segment.offset += RECORD.size
+
+    def _rotate(self):
+        # Under the lock: the full segment is handed to the commit thread,
+        # which closes it, and the spare takes its place. A segment only
+        # fills before the spare is ready if it is written faster than one
+        # segment per commit interval; then the new file is made here.
+        self._sealed.append(self.segment)
+        spare, self.spare = self.spare, None
+        if spare is None:
+            spare = Segment.create(self.directory, self._reserve(), self.segment_size)
+        self.segment = spare
+        self.committed = spare.offset
+        return spare
+
+    def _reserve(self):
+        # Under the lock: the next sequence number
+        seq = self._next_seq
+        self._next_seq += 1
+        return seq
+
+    def prepare_spare(self):
+        # Commit thread: creates the next segment while nothing waits on it
+        with self.lock:
+            if self.spare is not None or self.segment is None:
+                return
+            seq = self._reserve()
+        spare = Segment.create(self.directory, seq, self.segment_size)
+        with self.lock:
+            if seq > self.segment.seq:
+                self.spare, spare = spare, None
+        if spare is not None:
+            # Overtaken by a segment created in _rotate; it would be out of order
+            spare.close()
+            os.remove(spare.path)
+
+    def commit(self):
+        # Group commit: one msync covers every record written since the last
+        with self.lock:
+            segment, start, end = self.segment, self.committed, self.segment.offset
+            self.committed = end
+            sealed, self._sealed = self._sealed, []
+        for full in sealed:
+            full.close()
+        segment.flush(start, end)
+        if sealed:
+            self.maintain()
+        self.prepare_spare()
+
+    def _run(self):
+        while not self._stop.wait(self.commit_interval):
+            self.commit()
+
+    def close(self):
+        # Leaves a clean-close marker, so a missing one shows a crash or a
+        # power cut
+        self.append(KIND_APP, code=0)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.commit()
+        with self.lock:
+            self.segment.close()
+            self.segment = None
+            # The empty spare stays on disk and is written first next time
+            if self.spare is not None:
+                self.spare.close()
+                self.spare = None
+
+    def maintain(self):
+        # Compacts sealed raw segments beyond `keep_raw`, then drops the
+        # oldest compacted ones past the retention limits
+        with self.lock:
+            # Segments still mapped: the current one, the spare and full
+            # ones not yet closed
+            current = self.segment.seq
+            mapped = {segment.seq for segment in self._sealed}
+        segments = list_segments(self.directory)
+        sealed = [(seq, path) for seq, path, compacted in segments
+                  if not compacted and seq < current and seq not in mapped]
+        for seq, path in sealed[:max(0, len(sealed) - self.keep_raw)]:
+            self.compact(seq, path)
+        compacted = [path for seq, path, compacted in list_segments(self.directory) if compacted]
+        cutoff = time() - self.retention_days * 86400
+        total = sum(os.path.getsize(path) for path in compacted)
+        for path in compacted:
+            if total <= self.max_bytes and last_time(path) >= cutoff:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+    def compact(self, seq, path):
+        records = read_records(path)
+        samples = records['kind'] == KIND_SAMPLE
+        bucket = np.floor(records['time'] / self.sample_interval)
+        # First sample of each interval; every other record is kept
+        first = np.ones(len(records), dtype=bool)
+        sample_index = np.flatnonzero(samples)
+        first[sample_index[1:]] = bucket[sample_index[1:]] != bucket[sample_index[:-1]]
+        kept = records[~samples | first]
+        header = HEADER.pack(MAGIC, VERSION, RECORD.size, seq, time())
+        storage.write_files({segment_path(self.directory, seq, compacted=True): header + kept.tobytes()})
+        os.remove(path)
+
+
+def enable(directory, **kwargs):
+    global log
+    if log is None:
+        log = EventLog(directory, **kwargs).open()
+        log.append(KIND_APP, code=1)
+    return log
+
+
+def disable():
+    global log
+    if log is not None:
+        closing, log = log, None
+        closing.close()
+
+
+def query(directory, since=None, until=None, kinds=None, devices=None):
+    # Records in [since, until) (epoch seconds) of the given kinds and, for
+    # press and step records, devices, oldest first
+    parts = []
+    for seq, path, compacted in list_segments(directory):
+        records = read_records(path)
+        if not len(records):
+            continue
+        if (since is not None and records['time'][-1] < since) or (until is not None and records['time'][0] >= until):
+            continue
+        mask = np.ones(len(records), dtype=bool)
+        if since is not None:
+            mask &= records['time'] >= since
+        if until is not None:
+            mask &= records['time'] < until
+        if kinds:
+            mask &= np.isin(records['kind'], kinds)
+        if devices:
+            device_kinds = np.isin(records['kind'], (KIND_PRESS, KIND_STEP))
+            mask &= ~device_kinds | np.isin(records['subject'], [device_code(name) for name in devices])
+        parts.append(records[mask])
+    return np.concatenate(parts) if parts else np.empty(0, RECORD_DTYPE)
+
+
+def describe(entry):
+    kind = int(entry['kind'])
+    subject = int(entry['subject'])
+    code = int(entry['code'])
+    value = float(entry['value'])
+    if kind == KIND_PRESS and subject == SUBJECT_OFF:
+        return 'OFF'
+    if kind == KIND_PRESS and subject > SUBJECT_PROGRAM:
+        return f"C{subject - SUBJECT_PROGRAM} {'start' if code else 'cancel'}"
+    if kind in (KIND_PRESS, KIND_STEP):
+        device = DEVICES[subject] if subject < len(DEVICES) else f"device {subject}"
+        level = LEVELS[code] if 0 <= code < len(LEVELS) else 'other'
+        text = f"{device} {level or 'off'}"
+        return text + (f" at {value:.0f}s" if kind == KIND_STEP else '')
+    if kind == KIND_COMMAND:
+        return f"pin {subject} {COMMANDS.get(code, code)} {value:.0f}"
+    if kind == KIND_ERROR:
+        return f"pin {subject} failed ({code})"
+    if kind == KIND_SAMPLE:
+        return f"{value:.2f} C, heater {code / 10:.1f}%"
+    if kind == KIND_APP:
+        return 'started' if code else 'closed'
+    return f"{subject} {code} {value}"
+
+
+def print_stats(records):
+    print(f"{len(records)} records")
+    if not len(records):
+        return
+    print(f"from {datetime.fromtimestamp(records['time'][0])} to {datetime.fromtimestamp(records['time'][-1])}")
+    kinds, counts = np.unique(records['kind'], return_counts=True)
+    for kind, count in zip(kinds, counts):
+        print(f"  {KINDS.get(int(kind), kind):8s} {count}")
+    presses = records[records['kind'] == KIND_PRESS]
+    for index, name in enumerate(DEVICES):
+        count = np.count_nonzero(presses['subject'] == index)
+        if count:
+            print(f"  {name} pressed {count} times")
+    for subject in np.unique(presses['subject'][presses['subject'] > SUBJECT_PROGRAM]):
+        name = 'OFF' if subject == SUBJECT_OFF else f"C{subject - SUBJECT_PROGRAM}"
+        print(f"  {name} pressed {np.count_nonzero(presses['subject'] == subject)} times")
+    samples = records[records['kind'] == KIND_SAMPLE]['value']
+    if len(samples):
+        print(f"  temperature min {samples.min():.2f}  mean {samples.mean():.2f}  max {samples.max():.2f} C")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the event log")
+    parser.add_argument('--dir', default=os.path.join('logs', 'events'))
+    parser.add_argument('--hours', type=float, default=24, help="look back this many hours (0: everything)")
+    parser.add_argument('--kind', action='append', choices=sorted(KINDS.values()))
+    parser.add_argument('--device', action='append', choices=DEVICES)
+    parser.add_argument('--stats', action='store_true', help="print a summary instead of the records")
+    parser.add_argument('--limit', type=int, default=0, help="only print the last N records")
+    args = parser.parse_args()
+
+    names = {name: kind for kind, name in KINDS.items()}
+    kinds = [names[name] for name in args.kind] if args.kind else None
+    since = time() - args.hours * 3600 if args.hours else None
+    records = query(args.dir, since=since, kinds=kinds, devices=args.device)
+    if args.stats:
+        print_stats(records)
+        return
+    for entry in records[-args.limit:] if args.limit else records:
+        stamp = datetime.fromtimestamp(float(entry['time'])).isoformat(sep=' ', timespec='milliseconds')
+        print(f"{stamp}  {KINDS.get(int(entry['kind']), '?'):8s} {describe(entry)}")
+
+
+if __name__ == '__main__':
+    main()
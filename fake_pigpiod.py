@@ -0,0 +1,107 @@
+# Local stand-in for pigpiod, for benchmarking and developing without the
+# machine. It speaks the same request/reply framing as gpio.py, keeps the last
+# level written to each pin and can add a delay per received packet to mimic
+# the Wi-Fi round-trip (pipelined requests arriving together pay it once).
+#
+#   python fake_pigpiod.py [--port 8888] [--latency-ms 5]
+import argparse
+import socket
+import socketserver
+import threading
+import time
+
+from gpio import CMD_HP, CMD_PWM, CMD_WRITE, REQUEST, RESPONSE
+
+
+class FakePigpiod(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), FakePigpiodHandler)
+        self.latency = latency
+        self.levels = {}
+        self.commands = 0
+        self.connections = 0
+        self.clients = set()
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='fake-pigpiod', daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def drop_clients(self):
+        # Simulate the link going down: every open client socket is reset
+        with self.lock:
+            clients = list(self.clients)
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def execute(self, cmd, p1, p2, ext):
+        with self.lock:
+            self.commands += 1
+            if cmd in (CMD_WRITE, CMD_PWM):
+                self.levels[p1] = p2
+            elif cmd == CMD_HP:
+                self.levels[p1] = int.from_bytes(ext[:4], 'little')
+        return 0
+
+
+class FakePigpiodHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        sock = self.request
+        with server.lock:
+            server.connections += 1
+            server.clients.add(sock)
+        buffer = b''
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                buffer += data
+                replies = []
+                while len(buffer) >= REQUEST.size:
+                    cmd, p1, p2, length = REQUEST.unpack_from(buffer)
+                    end = REQUEST.size + length
+                    if len(buffer) < end:
+                        break
+                    result = server.execute(cmd, p1, p2, buffer[REQUEST.size:end])
+                    replies.append(RESPONSE.pack(cmd, p1, p2, result))
+                    buffer = buffer[end:]
+                if replies:
+                    sock.sendall(b''.join(replies))
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.clients.discard(sock)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakePigpiod(args.host, args.port, args.latency_ms / 1000.0)
+    print(f"fake pigpiod listening on {args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
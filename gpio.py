@@ -0,0 +1,135 @@
+import queue
+import socket
+import struct
+import time
+from contextlib import contextmanager
+
+# Subset of the pigpiod socket protocol (see the pigpio "socket interface"
+# docs). Every request is four uint32 (cmd, p1, p2, length of extension)
+# followed by the extension; every reply echoes cmd/p1/p2 and carries a
+# signed result in the last field.
+CMD_WRITE = 4
+CMD_PWM = 5
+CMD_HP = 86
+
+REQUEST = struct.Struct('<IIII')
+RESPONSE = struct.Struct('<IIIi')
+
+
+class PigpioError(Exception):
+    pass
+
+
+def encode(cmd, p1=0, p2=0, ext=b''):
+    return REQUEST.pack(cmd, p1, p2, len(ext)) + ext
+
+
+def recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('pigpiod closed the connection')
+        data += chunk
+    return data
+
+
+class PigpioConnection(object):
+    # One socket to a pigpio daemon. Not thread safe; it is meant to be owned
+    # by the I/O worker thread.
+    def __init__(self, host, port, timeout=2.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        if self.sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+        return self.sock
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def pipeline(self, commands):
+        # Send every (cmd, p1, p2[, ext]) request in a single write and then
+        # read the replies in order: one round-trip for the whole batch.
+        # Returns the raw results; negative values are pigpio error codes.
+        sock = self.connect()
+        try:
+            sock.sendall(b''.join(encode(*command) for command in commands))
+            replies = recv_exact(sock, RESPONSE.size * len(commands))
+        except OSError:
+            self.close()
+            raise
+        return [reply[3] for reply in RESPONSE.iter_unpack(replies)]
+
+    def command(self, cmd, p1=0, p2=0, ext=b''):
+        return check(cmd, self.pipeline([(cmd, p1, p2, ext)])[0])
+
+
+def check(cmd, result):
+    if result < 0:
+        raise PigpioError(f"pigpiod command {cmd} failed with {result}")
+    return result
+
+
+class PigpioPool(object):
+    # A few long-lived connections to one pigpio host, shared by everything
+    # that talks to it. A dropped link is reconnected with exponential
+    # backoff; batches are simply resent, which is safe because every command
+    # used here sets an absolute level.
+    def __init__(self, host, port, size=2, timeout=2.0, backoff=0.1, max_backoff=5.0, attempts=5):
+        self.host = host
+        self.port = port
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.attempts = attempts
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(PigpioConnection(host, port, timeout))
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def pipeline(self, commands):
+        delay = self.backoff
+        with self.connection() as conn:
+            for attempt in range(self.attempts):
+                try:
+                    return conn.pipeline(commands)
+                except OSError:
+                    if attempt + 1 == self.attempts:
+                        raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def command(self, cmd, p1=0, p2=0, ext=b''):
+        return check(cmd, self.pipeline([(cmd, p1, p2, ext)])[0])
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+
+
+def get_pool(host, port, **kwargs):
+    # One pool per pigpio host for the whole process
+    key = (host, port)
+    if key not in _pools:
+        _pools[key] = PigpioPool(host, port, **kwargs)
+    return _pools[key]
@@ -0,0 +1,255 @@
+# Boiler temperature control. A controller thread samples the temperature
+# sensor at a fixed rate, runs a PID or hysteresis law and drives the heater
+# output; every sample goes into a preallocated ring buffer. The UI never
+# touches the loop: it reads the latest sample and decimated snapshots of
+# the buffer on its own schedule, so a slow frame cannot delay control.
+# A simulated boiler stands in for the hardware when testing and
+# benchmarking headless.
+import random
+import threading
+from array import array
+from collections import namedtuple
+from time import monotonic
+
+from kivy.logger import Logger
+
+import eventlog
+
+# Samples in time order, `stride` samples apart; `end` is the index of the
+# last one since the loop started, so sample i was taken at i / rate
+Snapshot = namedtuple('Snapshot', ('end', 'stride', 'temperature', 'output'))
+
+
+class SampleRing(object):
+    # Fixed-size history of (temperature, output) samples in two array('f')
+    # buffers. Written by the control thread, copied out by readers; the
+    # lock is only held for the write of one sample or the copy of a slice.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.temperature = array('f', bytes(4 * capacity))
+        self.output = array('f', bytes(4 * capacity))
+        # Samples written since the start, including overwritten ones
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, temperature, output):
+        with self.lock:
+            index = self.count % self.capacity
+            self.temperature[index] = temperature
+            self.output[index] = output
+            self.count += 1
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None
+            index = (self.count - 1) % self.capacity
+            return self.count - 1, self.temperature[index], self.output[index]
+
+    def snapshot(self, points=None):
+        # Copy of the history in time order, keeping every stride-th sample
+        # (always including the newest) so at most `points` come back. Only
+        # the kept samples are copied, so a bounded snapshot costs the same
+        # however much history the buffer holds.
+        with self.lock:
+            count = self.count
+            size = min(count, self.capacity)
+            split = count % self.capacity if count > self.capacity else 0
+            stride = 1
+            if points and size > points:
+                stride = -(-size // points)
+            start = (size - 1) % stride if size else 0
+            # Oldest part runs from `split` to the end, newest from 0 to `split`
+            temperature = self.temperature[split + start:size:stride]
+            output = self.output[split + start:size:stride]
+            rest = start + len(temperature) * stride - (size - split)
+            temperature += self.temperature[rest:split:stride]
+            output += self.output[rest:split:stride]
+        return Snapshot(count - 1, stride, temperature, output)
+
+
+class PID(object):
+    # Output in [low, high]. The derivative acts on the measurement, so a
+    # setpoint change does not kick the output, and is low-pass filtered
+    # over about `smoothing` seconds against sensor noise. The integral is
+    # clamped to the output range so it cannot wind up while saturated.
+    def __init__(self, kp, ki, kd, smoothing=2.0, low=0.0, high=1.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.smoothing = smoothing
+        self.low = low
+        self.high = high
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.previous = None
+
+    def update(self, setpoint, value, dt):
+        error = setpoint - value
+        if self.previous is not None and dt > 0:
+            alpha = dt / (self.smoothing + dt)
+            self.derivative += alpha * ((value - self.previous) / dt - self.derivative)
+        self.previous = value
+        self.integral = min(self.high, max(self.low, self.integral + self.ki * error * dt))
+        output = self.kp * error + self.integral - self.kd * self.derivative
+        return min(self.high, max(self.low, output))
+
+
+class Hysteresis(object):
+    # On/off control: full output below setpoint - band/2, off above
+    # setpoint + band/2, unchanged in between
+    def __init__(self, band):
+        self.band = band
+        self.reset()
+
+    def reset(self):
+        self.on = False
+
+    def update(self, setpoint, value, dt):
+        if value <= setpoint - self.band / 2:
+            self.on = True
+        elif value >= setpoint + self.band / 2:
+            self.on = False
+        return 1.0 if self.on else 0.0
+
+
+def make_law(mode, band=2.0, kp=0.2, ki=0.002, kd=10.0):
+    if mode == 'pid':
+        return PID(kp, ki, kd)
+    if mode == 'hysteresis':
+        return Hysteresis(band)
+    raise ValueError(f"Unknown heater mode {mode!r}")
+
+
+def build_heater(config):
+    # HeaterController for the `heater` settings section
+    law = make_law(config['mode'], config['band'], config['kp'], config['ki'], config['kd'])
+    if config['sensor'] != 'simulated':
+        raise ValueError(f"No driver for heater sensor {config['sensor']!r}")
+    plant = SimulatedPlant()
+    return HeaterController(plant.read, plant.apply, law, config['setpoint'], config['rate'], config['history'])
+
+
+class HeaterController(object):
+    # Calls sensor() for the temperature in degrees C and output(fraction)
+    # with the heater power in [0, 1], `rate` times a second on its own
+    # thread. Ticks are scheduled on absolute deadlines so the period does
+    # not drift; a tick that overruns the next deadline is counted and the
+    # missed ones are skipped rather than run back to back. A sensor error
+    # switches the heater off until the sensor reads again.
+    def __init__(self, sensor, output, law, setpoint=95.0, rate=10, history=600):
+        self.sensor = sensor
+        self.output = output
+        self.law = law
+        self.setpoint = setpoint
+        self.rate = rate
+        self.samples = SampleRing(int(history * rate))
+        self.overruns = 0
+        self.sensor_errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='heater', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        # Leaves the heater off
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.output(0.0)
+
+    def step(self, dt):
+        # One control tick; also driven directly by the headless simulation
+        try:
+            temperature = self.sensor()
+        except (OSError, ValueError) as exc:
+            self.sensor_errors += 1
+            if self.sensor_errors == 1:
+                Logger.warning(f"Heater: sensor failed, heater off: {exc}")
+            self.law.reset()
+            self.output(0.0)
+            return
+        if self.sensor_errors:
+            Logger.info(f"Heater: sensor back after {self.sensor_errors} failed reads")
+            self.sensor_errors = 0
+        power = self.law.update(self.setpoint, temperature, dt)
+        self.output(power)
+        self.samples.append(temperature, power)
+        eventlog.record(eventlog.KIND_SAMPLE, 0, int(power * 1000), temperature)
+
+    def _run(self):
+        period = 1.0 / self.rate
+        last = monotonic()
+        deadline = last + period
+        while not self._stop.wait(max(0.0, deadline - monotonic())):
+            now = monotonic()
+            self.step(now - last)
+            last = now
+            deadline += period
+            if monotonic() > deadline:
+                missed = int((monotonic() - deadline) / period) + 1
+                self.overruns += missed
+                deadline += missed * period
+
+    def publish(self, state):
+        # Main thread: mirrors the latest sample into machine_state
+        latest = self.samples.latest()
+        if latest is None:
+            return
+        _, temperature, power = latest
+        state.temperature = round(temperature, 1)
+        state.heating = power > 0
+
+
+class SimulatedPlant(object):
+    # Boiler model: an element with its own heat capacity heats the water,
+    # the water loses heat to the room and the sensor reads the water with
+    # some noise. The element lag makes the loop overshoot when tuned badly,
+    # like the real thing. With a `clock`, time advances by the real time
+    # between reads times `speed`; without, only through advance().
+    def __init__(self, ambient=20.0, power=1200.0, element_capacity=300.0, water_capacity=4200.0,
+                 exchange=100.0, loss=1.5, noise=0.05, clock=monotonic, speed=1.0, seed=None):
+        self.ambient = ambient
+        self.power = power
+        self.element_capacity = element_capacity
+        self.water_capacity = water_capacity
+        self.exchange = exchange
+        self.loss = loss
+        self.noise = noise
+        self.clock = clock
+        self.speed = speed
+        self.rng = random.Random(seed)
+        self.element = ambient
+        self.water = ambient
+        self.drive = 0.0
+        self.last = clock() if clock is not None else None
+
+    def advance(self, dt):
+        # Explicit Euler in sub-steps short enough to stay stable
+        steps = max(1, int(dt / 0.05) + 1)
+        h = dt / steps
+        for _ in range(steps):
+            flow = self.exchange * (self.element - self.water)
+            self.element += h * (self.power * self.drive - flow) / self.element_capacity
+            self.water += h * (flow - self.loss * (self.water - self.ambient)) / self.water_capacity
+
+    def read(self):
+        if self.clock is not None:
+            now = self.clock()
+            self.advance((now - self.last) * self.speed)
+            self.last = now
+        return self.water + self.rng.gauss(0.0, self.noise)
+
+    def apply(self, fraction):
+        self.drive = min(1.0, max(0.0, fraction))
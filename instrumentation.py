@@ -0,0 +1,239 @@
+# Opt-in latency instrumentation: touch-to-actuator timing of the manual
+# device buttons and frame times, recorded into fixed-size histograms. When
+# disabled, `recorder` is None and the hooks in the button, device and I/O
+# paths reduce to a None check.
+#
+# A traced button press is timestamped (monotonic) at
+#   touch    the touch event was created by the input provider
+#   handler  the button handler started
+#   queue    the GPIO commands were handed to the I/O worker
+#   send     the I/O worker started sending them to pigpiod
+#   ack      pigpiod replied
+import json
+import math
+import threading
+from array import array
+from time import monotonic, time
+
+from kivy.clock import Clock
+from kivy.uix.label import Label
+
+# Recorder while instrumentation is enabled
+recorder = None
+# Trace of the button press being handled; main thread only
+current = None
+
+# Intervals recorded for every traced press, as (name, from stage, to stage)
+INTERVALS = (
+    ('touch->handler', 'touch', 'handler'),
+    ('handler->queue', 'handler', 'queue'),
+    ('queue->send', 'queue', 'send'),
+    ('send->ack', 'send', 'ack'),
+    ('touch->ack', 'touch', 'ack'),
+)
+
+
+class Histogram(object):
+    # Log-scale histogram of durations in seconds: `per_octave` buckets per
+    # doubling from `low` up to `high`, plus an underflow and an overflow
+    # bucket. Memory is fixed however many samples are added.
+    def __init__(self, low=1e-5, high=10.0, per_octave=8):
+        self.low = low
+        self.per_octave = per_octave
+        self.buckets = int(math.ceil(math.log2(high / low) * per_octave)) + 2
+        self.counts = array('L', bytes(array('L').itemsize * self.buckets))
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        if value < self.low:
+            return 0
+        return min(self.buckets - 1, 1 + int(math.log2(value / self.low) * self.per_octave))
+
+    def upper_bound(self, bucket):
+        return self.low * 2 ** (bucket / self.per_octave)
+
+    def add(self, value):
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        # Upper bound of the bucket holding the pct-th sample
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * pct / 100.0)))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Trace(object):
+    __slots__ = ('device', 'touch', 'handler', 'queue')
+
+    def __init__(self, device, touch, handler):
+        self.device = device
+        self.touch = touch
+        self.handler = handler
+        self.queue = None
+
+    def finish(self, send, ack):
+        # Called on the I/O worker thread once pigpiod replied
+        if recorder is not None:
+            recorder.record_trace(self, send, ack)
+
+
+class Recorder(object):
+    # Histograms by name; traces complete on the I/O worker thread while
+    # frames are recorded on the main thread, so adds take a lock
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def record_trace(self, trace, send, ack):
+        stages = {'touch': trace.touch, 'handler': trace.handler, 'queue': trace.queue,
+                  'send': send, 'ack': ack}
+        for name, start, end in INTERVALS:
+            if stages[start] is not None and stages[end] is not None:
+                self.add(name, stages[end] - stages[start])
+
+    def summaries(self):
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def dump(self, path):
+        with open(path, 'w') as file:
+            json.dump({'time': time(), 'histograms': self.summaries()}, file, indent=2)
+
+
+def touch_time(touch):
+    # MotionEvent.time_start is wall-clock time; move it to the monotonic clock
+    if touch is None:
+        return None
+    return monotonic() - (time() - touch.time_start)
+
+
+def begin(device, touch):
+    # Starts tracing a button press and makes it `current` until end();
+    # returns None at the cost of one check when instrumentation is off
+    global current
+    if recorder is None:
+        return None
+    current = Trace(device, touch_time(touch), monotonic())
+    return current
+
+
+def end(trace):
+    global current
+    current = None
+
+
+class FrameProbe(object):
+    # Records the interval between frames, separately while a screen
+    # transition is running. Kivy only flips when something needs redrawing,
+    # so an interval counts only while frames are continuous: the previous
+    # flip came at most two frame periods earlier, or both flips fell inside
+    # the same transition (where a long frame is real jank). Any other gap is
+    # idle time and just resets the baseline.
+    def __init__(self, window, manager):
+        self.window = window
+        self.manager = manager
+        self.last = None
+        self.last_in_transition = False
+
+    def start(self):
+        self.window.bind(on_flip=self.on_flip)
+        return self
+
+    def stop(self):
+        self.window.unbind(on_flip=self.on_flip)
+
+    def on_flip(self, *args):
+        now = monotonic()
+        transition = self.manager.transition if self.manager is not None else None
+        in_transition = transition is not None and transition.is_active
+        if self.last is not None and recorder is not None:
+            interval = now - self.last
+            period = 1.0 / (Clock._max_fps or 60)
+            if interval <= 2 * period or (in_transition and self.last_in_transition):
+                recorder.add('frame', interval)
+                if in_transition:
+                    recorder.add('frame (transition)', interval)
+        self.last = now
+        self.last_in_transition = in_transition
+
+
+class Overlay(Label):
+    # Live summary of the histograms in the top-left corner, over every screen
+    def __init__(self, window, **kwargs):
+        super(Overlay, self).__init__(font_name='RobotoMono-Regular', font_size='12sp',
+                                      color=(1, 1, 0, 1), size_hint=(None, None), **kwargs)
+        self.window = window
+        self.bind(texture_size=self.setter('size'))
+        self.event = None
+
+    def start(self):
+        self.window.add_widget(self)
+        self.event = Clock.schedule_interval(self.refresh, 1)
+        return self
+
+    def stop(self):
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+        self.window.remove_widget(self)
+
+    def refresh(self, dt):
+        if recorder is not None:
+            self.text = format_summaries(recorder.summaries()) or "instrumentation: no samples yet"
+            self.pos = (0, self.window.height - self.height)
+
+
+def format_summaries(summaries):
+    lines = []
+    for name, summary in summaries.items():
+        if summary['count']:
+            lines.append(f"{name:20s} n={summary['count']:<6d} p50 {summary['p50'] * 1000:7.2f} ms  "
+                         f"p99 {summary['p99'] * 1000:7.2f} ms  max {summary['max'] * 1000:7.2f} ms")
+    return '\n'.join(lines)
+
+
+def enable():
+    global recorder
+    if recorder is None:
+        recorder = Recorder()
+    return recorder
+
+
+def disable():
+    global recorder
+    recorder = None
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from queue import Full
+
+from time import monotonic
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+import eventlog
+from gpio import PigpioError
+
+
+def report_on_clock(callback, key, error):
+    # Completion callbacks run on the Kivy main thread
+    Clock.schedule_once(lambda dt: callback(key, error))
+
+
+class IOWorker(object):
+    # Runs hardware commands on a dedicated thread so network round-trips to
+    # pigpiod never block the Kivy event loop. Commands are queued per key
+    # (one key per device); submitting for a key that is still queued replaces
+    # the queued commands, because only the latest state of a device matters.
+    # Everything queued when the thread wakes is sent as one pipelined batch.
+    def __init__(self, connection, maxsize=32, report=report_on_clock):
+        self.connection = connection
+        self.maxsize = maxsize
+        self.report = report
+        self.coalesced = 0
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='io-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        # Queued commands are still sent before the thread exits
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, key, commands, callback=None, trace=None):
+        self.submit_many([(key, commands)], callback, trace)
+
+    def submit_many(self, entries, callback=None, trace=None):
+        # Queue several (key, commands) entries atomically so they are flushed
+        # in the same batch, e.g. the three stops of a "stop All" step.
+        # `trace.finish(send, ack)` is called with the monotonic send and
+        # reply times of the batch (see instrumentation).
+        with self._cond:
+            new_keys = {key for key, _ in entries if key not in self._pending}
+            if len(self._pending) + len(new_keys) > self.maxsize:
+                raise Full(f"I/O queue is full ({self.maxsize} entries)")
+            for key, commands in entries:
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [commands, [callback] if callback else [], [trace] if trace else []]
+                else:
+                    entry[0] = commands
+                    if callback:
+                        entry[1].append(callback)
+                    if trace:
+                        entry[2].append(trace)
+                    self.coalesced += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = list(self._pending.items())
+                self._pending.clear()
+            self._flush(batch)
+
+    def _flush(self, batch):
+        commands = [command for _, (entry_commands, _, _) in batch for command in entry_commands]
+        traces = {trace for _, (_, _, entry_traces) in batch for trace in entry_traces}
+        send = monotonic() if traces else None
+        try:
+            results = self.connection.pipeline(commands)
+            batch_error = None
+        except OSError as exc:
+            results = None
+            batch_error = exc
+        if traces and batch_error is None:
+            ack = monotonic()
+            for trace in traces:
+                trace.finish(send, ack)
+        index = 0
+        for key, (entry_commands, callbacks, _) in batch:
+            error = batch_error
+            if results is not None:
+                for command, result in zip(entry_commands, results[index:index + len(entry_commands)]):
+                    if result < 0:
+                        error = PigpioError(f"pigpiod command {command[0]} failed with {result}")
+                        eventlog.record(eventlog.KIND_ERROR, command[1], result)
+                    else:
+                        eventlog.record(eventlog.KIND_COMMAND, command[1], command[0], command[2])
+                index += len(entry_commands)
+            elif eventlog.log is not None:
+                for command in entry_commands:
+                    eventlog.record(eventlog.KIND_ERROR, command[1], -1)
+            if error is not None:
+                Logger.warning(f"IOWorker: {key} failed: {error}")
+            for callback in callbacks:
+                self.report(callback, key, error)
@@ -4,17 +4,61 @@ from kivy.uix.button import Button
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.scrollview import ScrollView
-from kivy.graphics import Color, RoundedRectangle, Line
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.graphics import Color, RoundedRectangle
 from kivy.core.window import Window
 from kivy.clock import Clock
+from kivy.logger import Logger
 import yaml
-import os
 
-# Global variable for heating state
-heating_state = False
+import eventlog
+import instrumentation
+from analysis import analyze, format_duration
+from backlight import Backlight
+from chart import TrendChart
+from devices import DeviceController
+from engine import Scheduler
+from gpio import get_pool
+from heater import build_heater
+from io_worker import IOWorker
+from neopixel import StatusLeds
+from programs import ProgramCache, program_path
+from sequence import compile_actions, describe_action
+from settings import load_settings, save_settings
+from shutdown import ShutdownService
+from standby import Standby
+from state import machine_state
 
-class MainMenuScreen(Screen):
+# Standby timeouts offered on the settings screen, in minutes; 0 is off
+STANDBY_OPTIONS = (15, 30, 60, 120, 240, 0)
+# Backlight brightness presets on the settings screen, in percent
+BRIGHTNESS_OPTIONS = (100, 75, 50, 25)
+
+def heating_text(heating):
+    return "Heating: ON" if heating else "Heating: OFF"
+
+def standby_text(minutes):
+    return f"Standby: {minutes} min" if minutes else "Standby: Off"
+
+class HeatingScreen(Screen):
+    # Base for screens with the heating label at the top. Only the visible
+    # screen is bound to machine_state, so hidden screens never re-render it.
+    def on_pre_enter(self, *args):
+        self.update_heating_label(machine_state, machine_state.heating)
+        machine_state.bind(heating=self.update_heating_label)
+
+    def on_leave(self, *args):
+        machine_state.unbind(heating=self.update_heating_label)
+
+    def update_heating_label(self, instance, heating):
+        self.heating_label.text = heating_text(heating)
+
+    def shutdown_sequence(self, instance):
+        App.get_running_app().shutdown.begin(self.manager)
+
+class MainMenuScreen(HeatingScreen):
     def __init__(self, **kwargs):
         super(MainMenuScreen, self).__init__(**kwargs)
         layout = FloatLayout()
@@ -33,9 +77,9 @@ class MainMenuScreen(Screen):
                 radius=[(0, 0), (0, 0), (15, 15), (15, 15)]
             )
         
-        # Heating label that updates based on the global heating state
+        # Heating label that follows machine_state while the screen is visible
         self.heating_label = Label(
-            text="Heating: OFF" if not heating_state else "Heating: ON",
+            text=heating_text(machine_state.heating),
             size_hint=(None, None),
             size=(Window.width * 0.2, Window.height * 0.08),
             pos_hint={'center_x': 0.5, 'top': 1},
@@ -44,6 +88,18 @@ class MainMenuScreen(Screen):
         )
         layout.add_widget(self.heating_label)
         
+        # Boiler temperature trend next to the heating label, when the heater
+        # loop runs
+        self.trend_chart = None
+        heater = App.get_running_app().heater
+        if heater is not None:
+            self.trend_chart = TrendChart(
+                heater.samples,
+                size_hint=(0.36, 0.14),
+                pos_hint={'right': 0.98, 'top': 0.98}
+            )
+            layout.add_widget(self.trend_chart)
+        
         # Main buttons
         button_layout = BoxLayout(
             orientation='horizontal',
@@ -79,6 +135,10 @@ class MainMenuScreen(Screen):
             background_down=''
         )
 
+        self.button_steam.bind(on_press=lambda x: self.toggle_device('Steam', x.last_touch))
+        self.button_vacuum.bind(on_press=lambda x: self.toggle_device('Vacuum', x.last_touch))
+        self.button_extract.bind(on_press=lambda x: self.toggle_device('Hotwater', x.last_touch))
+
         button_layout.add_widget(self.button_steam)
         button_layout.add_widget(self.button_vacuum)
         button_layout.add_widget(self.button_extract)
@@ -129,11 +189,26 @@ class MainMenuScreen(Screen):
         
         self.add_widget(layout)
 
-        # Schedule heating label updates
-        Clock.schedule_interval(self.update_heating_label, 1)
+    def on_pre_enter(self, *args):
+        super(MainMenuScreen, self).on_pre_enter(*args)
+        if self.trend_chart is not None:
+            App.get_running_app().standby.register(self.trend_chart.start())
+
+    def on_leave(self, *args):
+        super(MainMenuScreen, self).on_leave(*args)
+        if self.trend_chart is not None:
+            App.get_running_app().standby.unregister(self.trend_chart.event)
+            self.trend_chart.stop()
 
-    def update_heating_label(self, dt):
-        self.heating_label.text = "Heating: OFF" if not heating_state else "Heating: ON"
+    def toggle_device(self, device, touch=None):
+        # Manual control outranks programs, see Scheduler
+        trace = instrumentation.begin(device, touch)
+        try:
+            level = None if machine_state.devices.get(device) else 'max'
+            eventlog.record(eventlog.KIND_PRESS, eventlog.device_code(device), eventlog.level_code(level))
+            App.get_running_app().scheduler.command(device, level)
+        finally:
+            instrumentation.end(trace)
 
     def open_menu(self, instance):
         self.manager.transition = SlideTransition(direction="up")
@@ -143,54 +218,8 @@ class MainMenuScreen(Screen):
         self.manager.transition = SlideTransition(direction="left")
         self.manager.current = 'extra_menu'
 
-    def shutdown_sequence(self, instance):
-        # Clear the screen except for the background
-        self.clear_widgets()
-        self.canvas.clear()
-        with self.canvas.before:
-            Color(0, 0.478, 0.905, 1)  # #007ae7 color
-            self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
-        
-        # Display shutdown message with border
-        with self.canvas:
-            Color(1, 1, 1, 1)
-            self.shutdown_rect = RoundedRectangle(
-                size=(Window.width * 0.6, Window.height * 0.2),
-                pos=(Window.width * 0.2, Window.height * 0.4),
-                radius=[20]
-            )
-            Color(0, 0, 0, 1)
-            Line(
-                rounded_rectangle=(
-                    Window.width * 0.2, Window.height * 0.4,
-                    Window.width * 0.6, Window.height * 0.2, 20
-                ),
-                width=2
-            )
-        
-        self.countdown_label = Label(
-            text="Shutting down in 5",
-            font_size='30sp',
-            size_hint=(None, None),
-            size=(Window.width * 0.6, Window.height * 0.2),
-            pos=(Window.width * 0.2, Window.height * 0.4),
-            color=(0, 0, 0, 1)
-        )
-        self.add_widget(self.countdown_label)
-        
-        # Start countdown
-        self.countdown = 5
-        Clock.schedule_interval(self.update_countdown, 1)
 
-    def update_countdown(self, dt):
-        self.countdown -= 1
-        if self.countdown > 0:
-            self.countdown_label.text = f"Shutting down in {self.countdown}"
-        else:
-            App.get_running_app().stop()
-            Window.close()
-
-class MenuScreen(Screen):
+class MenuScreen(HeatingScreen):
     def __init__(self, **kwargs):
         super(MenuScreen, self).__init__(**kwargs)
         layout = FloatLayout()
@@ -211,7 +240,7 @@ class MenuScreen(Screen):
         
         # Heating label
         self.heating_label = Label(
-            text="Heating: OFF" if not heating_state else "Heating: ON",
+            text=heating_text(machine_state.heating),
             size_hint=(None, None),
             size=(Window.width * 0.2, Window.height * 0.08),
             pos_hint={'center_x': 0.5, 'top': 1},
@@ -295,12 +324,6 @@ class MenuScreen(Screen):
         layout.add_widget(bottom_layout)
     
         self.add_widget(layout)
-
-        # Schedule heating label updates
-        Clock.schedule_interval(self.update_heating_label, 1)
-    
-    def update_heating_label(self, dt):
-        self.heating_label.text = "Heating: OFF" if not heating_state else "Heating: ON"
     
     def go_back(self, instance):
         self.manager.transition = SlideTransition(direction="down")
@@ -310,52 +333,8 @@ class MenuScreen(Screen):
         self.manager.transition = SlideTransition(direction="left")
         self.manager.current = 'settings'
     
-    def shutdown_sequence(self, instance):
-        self.clear_widgets()
-        self.canvas.clear()
-        with self.canvas.before:
-            Color(0, 0.478, 0.905, 1)
-            self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
-        
-        # Display shutdown message with border
-        with self.canvas:
-            Color(1, 1, 1, 1)
-            self.shutdown_rect = RoundedRectangle(
-                size=(Window.width * 0.6, Window.height * 0.2),
-                pos=(Window.width * 0.2, Window.height * 0.4),
-                radius=[20]
-            )
-            Color(0, 0, 0, 1)
-            Line(
-                rounded_rectangle=(
-                    Window.width * 0.2, Window.height * 0.4,
-                    Window.width * 0.6, Window.height * 0.2, 20
-                ),
-                width=2
-            )
-        
-        self.countdown_label = Label(
-            text="Shutting down in 5",
-            font_size='30sp',
-            size_hint=(None, None),
-            size=(Window.width * 0.6, Window.height * 0.2),
-            pos=(Window.width * 0.2, Window.height * 0.4),
-            color=(0, 0, 0, 1)
-        )
-        self.add_widget(self.countdown_label)
-        
-        self.countdown = 5
-        Clock.schedule_interval(self.update_countdown, 1)
-    
-    def update_countdown(self, dt):
-        self.countdown -= 1
-        if self.countdown > 0:
-            self.countdown_label.text = f"Shutting down in {self.countdown}"
-        else:
-            App.get_running_app().stop()
-            Window.close()
 
-class SettingsScreen(Screen):
+class SettingsScreen(HeatingScreen):
     def __init__(self, **kwargs):
         super(SettingsScreen, self).__init__(**kwargs)
         layout = FloatLayout()
@@ -376,7 +355,7 @@ class SettingsScreen(Screen):
         
         # Heating label
         self.heating_label = Label(
-            text="Heating: OFF" if not heating_state else "Heating: ON",
+            text=heating_text(machine_state.heating),
             size_hint=(None, None),
             size=(Window.width * 0.2, Window.height * 0.08),
             pos_hint={'center_x': 0.5, 'top': 1},
@@ -392,20 +371,26 @@ class SettingsScreen(Screen):
             pos_hint={'center_x': 0.5, 'center_y': 0.5},
             spacing=20
         )
-        button_layout.add_widget(Button(
-            text="Standby: 120 min",
+        self.standby_button = Button(
+            text=standby_text(App.get_running_app().standby.timeout),
             font_size='24sp',
             background_color=(0.008, 0.408, 0.78, 1),
             background_normal='',
             color=(1, 1, 1, 1)
-        ))
-        button_layout.add_widget(Button(
-            text="Screen Brightness: 100%",
+        )
+        self.standby_button.bind(on_press=self.cycle_standby)
+        button_layout.add_widget(self.standby_button)
+        backlight = App.get_running_app().backlight
+        self.brightness_button = Button(
+            text=f"Screen Brightness: {backlight.brightness if backlight else 100}%",
             font_size='24sp',
             background_color=(0.008, 0.408, 0.78, 1),
             background_normal='',
-            color=(1, 1, 1, 1)
-        ))
+            color=(1, 1, 1, 1),
+            disabled=backlight is None
+        )
+        self.brightness_button.bind(on_press=self.cycle_brightness)
+        button_layout.add_widget(self.brightness_button)
         button_layout.add_widget(Button(
             text="Bluetooth",
             font_size='24sp',
@@ -454,63 +439,39 @@ class SettingsScreen(Screen):
         layout.add_widget(bottom_layout)
     
         self.add_widget(layout)
-
-        # Schedule heating label updates
-        Clock.schedule_interval(self.update_heating_label, 1)
-    
-    def update_heating_label(self, dt):
-        self.heating_label.text = "Heating: OFF" if not heating_state else "Heating: ON"
     
     def go_back(self, instance):
         self.manager.transition = SlideTransition(direction="right")
         self.manager.current = 'menu'
-    
-    def shutdown_sequence(self, instance):
-        self.clear_widgets()
-        self.canvas.clear()
-        with self.canvas.before:
-            Color(0, 0.478, 0.905, 1)
-            self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
-        
-        # Display shutdown message with border
-        with self.canvas:
-            Color(1, 1, 1, 1)
-            self.shutdown_rect = RoundedRectangle(
-                size=(Window.width * 0.6, Window.height * 0.2),
-                pos=(Window.width * 0.2, Window.height * 0.4),
-                radius=[20]
-            )
-            Color(0, 0, 0, 1)
-            Line(
-                rounded_rectangle=(
-                    Window.width * 0.2, Window.height * 0.4,
-                    Window.width * 0.6, Window.height * 0.2, 20
-                ),
-                width=2
-            )
-        
-        self.countdown_label = Label(
-            text="Shutting down in 5",
-            font_size='30sp',
-            size_hint=(None, None),
-            size=(Window.width * 0.6, Window.height * 0.2),
-            pos=(Window.width * 0.2, Window.height * 0.4),
-            color=(0, 0, 0, 1)
-        )
-        self.add_widget(self.countdown_label)
-        
-        self.countdown = 5
-        Clock.schedule_interval(self.update_countdown, 1)
-    
-    def update_countdown(self, dt):
-        self.countdown -= 1
-        if self.countdown > 0:
-            self.countdown_label.text = f"Shutting down in {self.countdown}"
+
+    def cycle_standby(self, instance):
+        standby = App.get_running_app().standby
+        if standby.timeout in STANDBY_OPTIONS:
+            minutes = STANDBY_OPTIONS[(STANDBY_OPTIONS.index(standby.timeout) + 1) % len(STANDBY_OPTIONS)]
+        else:
+            minutes = STANDBY_OPTIONS[0]
+        standby.set_timeout(minutes)
+        instance.text = standby_text(minutes)
+        try:
+            save_settings({'standby': {'timeout': minutes}})
+        except OSError as exc:
+            Logger.error(f"Settings: could not save the standby timeout: {exc}")
+
+    def cycle_brightness(self, instance):
+        backlight = App.get_running_app().backlight
+        if backlight.brightness in BRIGHTNESS_OPTIONS:
+            percent = BRIGHTNESS_OPTIONS[(BRIGHTNESS_OPTIONS.index(backlight.brightness) + 1) % len(BRIGHTNESS_OPTIONS)]
         else:
-            App.get_running_app().stop()
-            Window.close()
+            percent = BRIGHTNESS_OPTIONS[0]
+        backlight.set_brightness(percent)
+        instance.text = f"Screen Brightness: {percent}%"
+        try:
+            save_settings({'backlight': {'brightness': percent}})
+        except OSError as exc:
+            Logger.error(f"Settings: could not save the brightness: {exc}")
 
-class ExtraMenuScreen(Screen):
+
+class ExtraMenuScreen(HeatingScreen):
     def __init__(self, **kwargs):
         super(ExtraMenuScreen, self).__init__(**kwargs)
         layout = FloatLayout()
@@ -534,7 +495,7 @@ class ExtraMenuScreen(Screen):
         
         # Heating label
         self.heating_label = Label(
-            text="Heating: OFF" if not heating_state else "Heating: ON",
+            text=heating_text(machine_state.heating),
             size_hint=(None, None),
             size=(Window.width * 0.2, Window.height * 0.08),
             pos_hint={'center_x': 0.5, 'top': 1},
@@ -543,6 +504,17 @@ class ExtraMenuScreen(Screen):
         )
         layout.add_widget(self.heating_label)
         
+        # Progress and ETA of the running programs
+        self.progress_label = Label(
+            text="",
+            size_hint=(0.9, 0.06),
+            pos_hint={'center_x': 0.5, 'center_y': 0.85},
+            color=(1, 1, 1, 1),
+            font_size='20sp'
+        )
+        layout.add_widget(self.progress_label)
+        self.progress_event = None
+        
         # Main buttons (C1, C2, C3)
         button_layout = BoxLayout(
             orientation='horizontal',
@@ -571,6 +543,9 @@ class ExtraMenuScreen(Screen):
             background_normal='',
             color=(1, 1, 1, 1)
         )
+        self.button_c1.bind(on_press=lambda x: self.run_program('C1'))
+        self.button_c2.bind(on_press=lambda x: self.run_program('C2'))
+        self.button_c3.bind(on_press=lambda x: self.run_program('C3'))
         button_layout.add_widget(self.button_c1)
         button_layout.add_widget(self.button_c2)
         button_layout.add_widget(self.button_c3)
@@ -620,85 +595,141 @@ class ExtraMenuScreen(Screen):
     
         self.add_widget(layout)
     
-        # Schedule heating label updates
-        Clock.schedule_interval(self.update_heating_label, 1)
-    
     def load_actions(self):
         self.button_actions = {}
-        config_dir = 'config'
+        self.timelines = {}
+        self.analyses = {}
+        self.jobs = {}
+        self.program_cache = ProgramCache()
+        self.reload_actions()
+    
+    def reload_actions(self):
+        # Only programs whose file changed are reparsed and recompiled; a
+        # running program keeps the timeline it was started with
+        changed = []
         for i in range(1, 4):
-            filename = f'c{i}.yaml'
-            filepath = os.path.join(config_dir, filename)
-            if os.path.exists(filepath):
-                with open(filepath, 'r') as file:
-                    data = yaml.safe_load(file)
-                    self.button_actions[f'C{i}'] = data.get('actions', [])
-            else:
-                self.button_actions[f'C{i}'] = []
+            name = f'C{i}'
+            path = program_path(name)
+            try:
+                actions, reloaded = self.program_cache.load(path)
+                if not reloaded:
+                    continue
+                timeline = compile_actions(actions)
+            except (yaml.YAMLError, ValueError) as exc:
+                Logger.warning(f"Programs: cannot load {path}: {exc}")
+                continue
+            self.button_actions[name] = actions
+            self.timelines[name] = timeline
+            self.analyses[name] = analysis = analyze(timeline)
+            for conflict in analysis.conflicts:
+                Logger.warning(f"Programs: {name} at {format_duration(conflict.offset)}: {conflict.message}")
+            changed.append(name)
+            if self.manager is not None and self.manager.has_screen('show_actions'):
+                self.manager.get_screen('show_actions').update_section(name, actions, analysis)
+        return changed
+    
+    def on_pre_enter(self, *args):
+        super(ExtraMenuScreen, self).on_pre_enter(*args)
+        self.reload_actions()
+        self.update_progress()
+    
+    def on_leave(self, *args):
+        super(ExtraMenuScreen, self).on_leave(*args)
+        self.stop_progress()
+    
+    def update_progress(self, *args):
+        # Runs at 1 Hz while a program is running and this screen is shown;
+        # each update is a few bisects, whatever the program length
+        running = [job for job in self.jobs.values() if job.running]
+        if not running:
+            self.progress_label.text = ""
+            self.stop_progress()
+            return
+        parts = []
+        for job in running:
+            index = job.analysis.index
+            elapsed = job.elapsed()
+            active = ', '.join(index.active_at(elapsed)) or 'idle'
+            parts.append(f"{job.name} {index.progress(elapsed):.0%}  "
+                         f"{format_duration(index.remaining(elapsed))} left  ({active})")
+        self.progress_label.text = "    ".join(parts)
+        if self.progress_event is None:
+            self.progress_event = Clock.schedule_interval(self.update_progress, 1)
+            App.get_running_app().standby.register(self.progress_event)
+    
+    def stop_progress(self):
+        if self.progress_event is not None:
+            self.progress_event.cancel()
+            App.get_running_app().standby.unregister(self.progress_event)
+            self.progress_event = None
+    
+    def program_button(self, name):
+        return {'C1': self.button_c1, 'C2': self.button_c2, 'C3': self.button_c3}[name]
+    
+    def run_program(self, name):
+        # Pressing a running program stops it; other programs keep running
+        # and share the devices through the scheduler
+        scheduler = App.get_running_app().scheduler
+        job = self.jobs.get(name)
+        running = job is not None and job.running
+        eventlog.record(eventlog.KIND_PRESS, eventlog.program_code(name), 0 if running else 1)
+        if running:
+            scheduler.cancel(job)
+            return
+        if name not in self.timelines:
+            # The program failed to load; reload_actions logged why
+            Logger.warning(f"Sequence: {name} has no valid program to run")
+            return
+        job = scheduler.start(self.timelines[name], name, on_finish=self.on_program_finish)
+        # Progress is read from the analysis of the timeline the job runs
+        job.analysis = self.analyses[name]
+        self.jobs[name] = job
+        self.program_button(name).background_color = (0.004, 0.204, 0.39, 1)
+        Logger.info(f"Sequence: {name} started ({self.timelines[name].duration:.0f}s)")
+        if self.manager is not None and self.manager.current == self.name:
+            self.update_progress()
+    
+    def on_program_finish(self, job):
+        self.program_button(job.name).background_color = (0.008, 0.408, 0.78, 1)
+        Logger.info(f"Sequence: {job.name} finished")
+        if self.progress_event is not None:
+            self.update_progress()
     
-    def update_heating_label(self, dt):
-        self.heating_label.text = "Heating: OFF" if not heating_state else "Heating: ON"
     
     def go_back(self, instance):
         self.manager.transition = SlideTransition(direction="right")
         self.manager.current = 'main_menu'
     
-    def shutdown_sequence(self, instance):
-        self.clear_widgets()
-        self.canvas.clear()
-        with self.canvas.before:
-            Color(0, 0.478, 0.905, 1)
-            self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
-        
-        # Display shutdown message with border
-        with self.canvas:
-            Color(1, 1, 1, 1)
-            self.shutdown_rect = RoundedRectangle(
-                size=(Window.width * 0.6, Window.height * 0.2),
-                pos=(Window.width * 0.2, Window.height * 0.4),
-                radius=[20]
-            )
-            Color(0, 0, 0, 1)
-            Line(
-                rounded_rectangle=(
-                    Window.width * 0.2, Window.height * 0.4,
-                    Window.width * 0.6, Window.height * 0.2, 20
-                ),
-                width=2
-            )
-        
-        self.countdown_label = Label(
-            text="Shutting down in 5",
-            font_size='30sp',
-            size_hint=(None, None),
-            size=(Window.width * 0.6, Window.height * 0.2),
-            pos=(Window.width * 0.2, Window.height * 0.4),
-            color=(0, 0, 0, 1)
-        )
-        self.add_widget(self.countdown_label)
-        
-        self.countdown = 5
-        Clock.schedule_interval(self.update_countdown, 1)
-    
-    def update_countdown(self, dt):
-        self.countdown -= 1
-        if self.countdown > 0:
-            self.countdown_label.text = f"Shutting down in {self.countdown}"
-        else:
-            App.get_running_app().stop()
-            Window.close()
     
     def show_actions(self, instance):
         # Navigate to ShowActionsScreen
+        self.reload_actions()
         self.manager.transition = SlideTransition(direction="left")
         if not self.manager.has_screen('show_actions'):
-            self.manager.add_widget(ShowActionsScreen(self.button_actions, name='show_actions'))
+            self.manager.add_widget(ShowActionsScreen(self.button_actions, self.analyses, name='show_actions'))
         self.manager.current = 'show_actions'
 
+class ActionRow(RecycleDataViewBehavior, Label):
+    # One row of ShowActionsScreen's recycled list
+    def __init__(self, **kwargs):
+        kwargs.setdefault('color', (1, 1, 1, 1))
+        super(ActionRow, self).__init__(**kwargs)
+
+    def refresh_view_attrs(self, rv, index, data):
+        if 'text' not in data:
+            # Computed once, the first time the row scrolls into view; rows
+            # inside a repeat or subroutine are marked with their depth
+            data['text'] = '| ' * data.get('depth', 0) + rv.describe(data['action'])
+        header = data['kind'] == 'header'
+        self.text = data['text']
+        self.markup = header
+        self.font_size = '24sp' if header else '20sp'
+
 class ShowActionsScreen(Screen):
-    def __init__(self, button_actions, **kwargs):
+    def __init__(self, button_actions, analyses=None, **kwargs):
         super(ShowActionsScreen, self).__init__(**kwargs)
         self.button_actions = button_actions
+        self.analyses = analyses if analyses is not None else {}
         
         layout = FloatLayout()
         
@@ -707,52 +738,27 @@ class ShowActionsScreen(Screen):
             Color(0, 0.478, 0.905, 1)
             self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
         
-        # Scrollable area for actions
-        scroll_view = ScrollView(
+        # Recycled list of actions: only rows on screen have widgets
+        self.actions_view = RecycleView(
             size_hint=(1, 0.85),
             pos_hint={'x': 0, 'top': 0.95}
         )
-        content = BoxLayout(
+        self.actions_view.describe = self.parse_action
+        content = RecycleBoxLayout(
             orientation='vertical',
             size_hint_y=None,
+            default_size=(None, 30),
+            default_size_hint=(1, None),
+            key_size='size',
             spacing=10,
             padding=10
         )
         content.bind(minimum_height=content.setter('height'))
-        
-        for button_name in sorted(self.button_actions.keys()):
-            actions = self.button_actions[button_name]
-            # Display button name
-            button_label = Label(
-                text=f"[b]{button_name} Actions:[/b]",
-                markup=True,
-                font_size='24sp',
-                size_hint_y=None,
-                height=40,
-                color=(1, 1, 1, 1)
-            )
-            content.add_widget(button_label)
-            # Display actions
-            for action in actions:
-                action_text = self.parse_action(action)
-                action_label = Label(
-                    text=action_text,
-                    font_size='20sp',
-                    size_hint_y=None,
-                    height=30,
-                    color=(1, 1, 1, 1)
-                )
-                content.add_widget(action_label)
-            # Add a separator
-            separator = Label(
-                text="",
-                size_hint_y=None,
-                height=20
-            )
-            content.add_widget(separator)
-        
-        scroll_view.add_widget(content)
-        layout.add_widget(scroll_view)
+        self.actions_view.add_widget(content)
+        # Only takes effect once the layout manager is in place
+        self.actions_view.viewclass = 'ActionRow'
+        self.actions_view.data = self.build_rows(self.button_actions)
+        layout.add_widget(self.actions_view)
         
         # Bottom buttons (Back)
         bottom_layout = BoxLayout(
@@ -775,36 +781,190 @@ class ShowActionsScreen(Screen):
         
         self.add_widget(layout)
     
+    def section_rows(self, button_name, actions):
+        rows = [{'kind': 'header', 'text': f"[b]{button_name} Actions:[/b]", 'size': (None, 40)}]
+        analysis = self.analyses.get(button_name)
+        if analysis is not None:
+            rows.append({'kind': 'summary', 'text': self.summary_text(analysis), 'size': (None, 30)})
+        # Action text is filled in by ActionRow when the row is first shown.
+        # Loops are listed as written, not expanded.
+        rows.extend(self.action_rows(actions))
+        rows.append({'kind': 'separator', 'text': "", 'size': (None, 20)})
+        return rows
+    
+    def action_rows(self, actions, depth=0):
+        for action in actions:
+            yield {'kind': 'action', 'action': action, 'depth': depth, 'size': (None, 30)}
+            if str(action.get('type', '')).lower() in ('repeat', 'define'):
+                yield from self.action_rows(action.get('actions', []), depth + 1)
+    
+    def build_rows(self, button_actions):
+        rows = []
+        # Row range [start, end) of each button's section in the data list
+        self.sections = {}
+        for button_name in sorted(button_actions.keys()):
+            start = len(rows)
+            rows.extend(self.section_rows(button_name, button_actions[button_name]))
+            self.sections[button_name] = (start, len(rows))
+        return rows
+    
+    def summary_text(self, analysis):
+        on_time = ', '.join(f"{device} {format_duration(seconds)}"
+                            for device, seconds in analysis.on_time.items() if seconds)
+        text = f"Total {format_duration(analysis.duration)}"
+        if on_time:
+            text += f"  -  {on_time}"
+        if analysis.conflicts:
+            text += f"  -  {len(analysis.conflicts)} warning(s): {analysis.conflicts[0].message}"
+        return text
+    
+    def update_section(self, button_name, actions, analysis=None):
+        # Replace one button's rows in place; the other sections keep their
+        # rows (and cached text) and only shift position
+        if analysis is not None:
+            self.analyses[button_name] = analysis
+        if button_name not in self.sections:
+            self.button_actions[button_name] = actions
+            self.actions_view.data = self.build_rows(self.button_actions)
+            return
+        start, end = self.sections[button_name]
+        rows = self.section_rows(button_name, actions)
+        self.actions_view.data[start:end] = rows
+        shift = len(rows) - (end - start)
+        for name, (s, e) in self.sections.items():
+            if s > start:
+                self.sections[name] = (s + shift, e + shift)
+        self.sections[button_name] = (start, start + len(rows))
+    
     def parse_action(self, action):
-        action_type = action.get('type', '').capitalize()
-        if action_type == 'Start':
-            device = action.get('device', 'Unknown')
-            level = action.get('level', 'Unknown')
-            return f"Start {device} at {level} level."
-        elif action_type == 'Stop':
-            device = action.get('device', 'Unknown')
-            return f"Stop {device}."
-        elif action_type == 'Delay':
-            amount = action.get('amount', 'Unknown')
-            unit = action.get('unit', 'Unknown')
-            return f"Delay for {amount} {unit}."
-        else:
-            return "Unknown action."
+        return describe_action(action)
     
     def go_back(self, instance):
         self.manager.transition = SlideTransition(direction="right")
         self.manager.current = 'extra_menu'
 
+class LazyScreenManager(ScreenManager):
+    # Screens are registered as factories and only built the first time they
+    # are navigated to, so build() only pays for the screen shown at boot
+    def __init__(self, **kwargs):
+        super(LazyScreenManager, self).__init__(**kwargs)
+        self.factories = {}
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+
+    def build_screen(self, name):
+        screen = self.factories.pop(name)(name=name)
+        self.add_widget(screen)
+        return screen
+
+    def get_screen(self, name):
+        if name in self.factories:
+            return self.build_screen(name)
+        return super(LazyScreenManager, self).get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.factories or super(LazyScreenManager, self).has_screen(name)
+
+    def prewarm(self):
+        # Widgets must be built on the main thread, so build one pending
+        # screen after each drawn frame, starting once the boot screen is on
+        # the display. Clock callbacks are no use here: zero-timeout events
+        # run before the frame is drawn, and ones they schedule run in the
+        # same frame.
+        if self.factories:
+            Window.bind(on_flip=self.prewarm_next)
+            Window.canvas.ask_update()
+
+    def prewarm_next(self, *args):
+        Window.unbind(on_flip=self.prewarm_next)
+        if self.factories:
+            self.build_screen(next(iter(self.factories)))
+            # Bound from the next tick, not during this on_flip dispatch
+            Clock.schedule_once(lambda dt: self.prewarm())
+
 class MyApp(App):
+    # Build the remaining screens in the background after the first frame
+    prewarm_screens = True
+    # Strip driver for the status LEDs, called as led_sink(offset, grb_bytes);
+    # the status strip stays off while no driver is installed
+    led_sink = None
+
     def build(self):
-        sm = ScreenManager()
+        settings = load_settings()
+        pigpio = settings['pigpio']
+        # GPIO commands go through the I/O worker thread, never the event loop
+        self.instrumentation = settings['instrumentation']
+        if self.instrumentation['enabled']:
+            instrumentation.enable()
+        events = dict(settings['eventlog'])
+        if events.pop('enabled'):
+            try:
+                eventlog.enable(**events)
+            except OSError as exc:
+                Logger.error(f"Eventlog: not started: {exc}")
+        pool = get_pool(pigpio['host'], pigpio['port'])
+        self.io_worker = IOWorker(pool).start()
+        self.devices = DeviceController(self.io_worker, settings['devices'], settings['levels'])
+        if not settings['devices']:
+            Logger.warning("Devices: no GPIO pins configured in settings.yaml, device buttons do nothing")
+        # Programs and the manual buttons drive the devices through one scheduler
+        self.scheduler = Scheduler(self.devices.set_devices)
+        self.heater = None
+        if settings['heater']['enabled']:
+            try:
+                self.heater = build_heater(settings['heater'])
+            except ValueError as exc:
+                Logger.error(f"Heater: not started: {exc}")
+        self.shutdown = ShutdownService(self.scheduler, self.devices, self.io_worker, pool,
+                                        heater=self.heater, **settings['shutdown'])
+        self.backlight = None
+        backlight = dict(settings['backlight'])
+        pin = backlight.pop('pin')
+        if pin is not None:
+            self.backlight = Backlight(self.io_worker, pin, **backlight)
+        self.standby = Standby(Window, backlight=self.backlight, **settings['standby'])
+        # Last, so the log also records what the other hooks do
+        self.shutdown.flush_hooks.append(eventlog.disable)
+        self.status_leds = None
+        if self.led_sink is not None and settings['neopixel'].get('neo1') is not None:
+            self.status_leds = StatusLeds(settings['neopixel']['pixels'], self.led_sink,
+                                          fps=settings['neopixel']['fps']).start()
+
+        sm = LazyScreenManager()
         sm.add_widget(MainMenuScreen(name='main_menu'))
-        sm.add_widget(MenuScreen(name='menu'))
-        sm.add_widget(SettingsScreen(name='settings'))
-        sm.add_widget(ExtraMenuScreen(name='extra_menu'))
+        sm.register('menu', MenuScreen)
+        sm.register('settings', SettingsScreen)
+        sm.register('extra_menu', ExtraMenuScreen)
         # Note: ShowActionsScreen is added dynamically when needed
 
         return sm
 
+    def on_start(self):
+        if self.prewarm_screens:
+            # Starts after the first frame has been drawn
+            self.root.prewarm()
+        if instrumentation.recorder is not None:
+            instrumentation.FrameProbe(Window, self.root).start()
+            if self.instrumentation['overlay']:
+                overlay = instrumentation.Overlay(Window).start()
+                self.standby.register(overlay.event)
+        if self.backlight is not None:
+            self.backlight.set(self.backlight.brightness)
+        if self.heater is not None:
+            # The loop runs on its own thread; the UI only picks up its latest sample
+            self.heater.start()
+            Clock.schedule_interval(lambda dt: self.heater.publish(machine_state), 0.5)
+        self.standby.start()
+
+    def on_stop(self):
+        if self.heater is not None:
+            self.heater.stop()
+        self.io_worker.stop(timeout=2)
+        eventlog.disable()
+        if instrumentation.recorder is not None:
+            instrumentation.recorder.dump(self.instrumentation['dump'])
+            Logger.info(f"Instrumentation: histograms written to {self.instrumentation['dump']}")
+
 if __name__ == '__main__':
     MyApp().run()
@@ -0,0 +1,115 @@
+from kivy.clock import Clock
+
+from state import machine_state
+
+OFF = (0, 0, 0)
+
+# Colour shown for each machine status, as (r, g, b)
+STATUS_COLOURS = {
+    'steam': (255, 255, 255),
+    'vacuum': (0, 80, 255),
+    'extract': (0, 200, 120),
+    'heating': (255, 60, 0),
+}
+
+# Which device drives each device-backed status
+STATUS_DEVICES = {
+    'steam': 'Steam',
+    'vacuum': 'Vacuum',
+    'extract': 'Hotwater',
+}
+
+
+class FrameBuffer(object):
+    # Preallocated GRB frame for a WS2812 strip. Writes that change a byte
+    # widen the dirty range, so a refresh only has to push what changed.
+    # The whole frame starts dirty so the first refresh clears the strip.
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.data = bytearray(pixels * 3)
+        self.view = memoryview(self.data)
+        self._lo = 0
+        self._hi = len(self.data)
+
+    def set_pixel(self, index, rgb):
+        offset = index * 3
+        grb = bytes((rgb[1], rgb[0], rgb[2]))
+        if self.view[offset:offset + 3] != grb:
+            self.view[offset:offset + 3] = grb
+            self._lo = min(self._lo, offset)
+            self._hi = max(self._hi, offset + 3)
+
+    def fill(self, rgb, start=0, end=None):
+        if end is None:
+            end = self.pixels
+        if end <= start:
+            return
+        frame = bytes((rgb[1], rgb[0], rgb[2])) * (end - start)
+        lo, hi = start * 3, end * 3
+        if self.view[lo:hi] != frame:
+            self.view[lo:hi] = frame
+            self._lo = min(self._lo, lo)
+            self._hi = max(self._hi, hi)
+
+    @property
+    def dirty(self):
+        return self._lo < self._hi
+
+    def take_dirty(self):
+        # Returns (offset, memoryview) of the changed bytes and clears the
+        # range, or None when nothing changed since the last call
+        if not self.dirty:
+            return None
+        lo, hi = self._lo, self._hi
+        self._lo, self._hi = len(self.data), 0
+        return lo, self.view[lo:hi]
+
+
+class StatusLeds(object):
+    # Composites machine status onto the strip: the strip is split into one
+    # segment per status, lit in that status colour while it is active.
+    # Refreshes are triggered by state changes and capped at `fps`, so the
+    # LED output never costs more than that many sink writes per second.
+    # `sink(offset, data)` receives only the changed GRB bytes; `data` is a
+    # view into the frame, so a sink that defers the write must copy it.
+    def __init__(self, pixels, sink, fps=20, colours=STATUS_COLOURS):
+        self.buffer = FrameBuffer(pixels)
+        self.sink = sink
+        self.colours = colours
+        statuses = list(colours)
+        size = max(1, pixels // len(statuses))
+        # On a strip shorter than the status list the last statuses get an
+        # empty segment instead of running past the buffer
+        self.segments = {
+            status: (min(i * size, pixels), pixels if i == len(statuses) - 1 else min((i + 1) * size, pixels))
+            for i, status in enumerate(statuses)
+        }
+        self._trigger = Clock.create_trigger(self.refresh, 1.0 / fps)
+
+    def start(self):
+        machine_state.bind(devices=self._trigger, heating=self._trigger)
+        self._trigger()
+        return self
+
+    def stop(self):
+        machine_state.unbind(devices=self._trigger, heating=self._trigger)
+        self._trigger.cancel()
+
+    def active_statuses(self):
+        active = {status for status, device in STATUS_DEVICES.items()
+                  if machine_state.devices.get(device) is not None}
+        if machine_state.heating:
+            active.add('heating')
+        return active
+
+    def compose(self):
+        active = self.active_statuses()
+        for status, (start, end) in self.segments.items():
+            self.buffer.fill(self.colours[status] if status in active else OFF, start, end)
+
+    def refresh(self, *args):
+        self.compose()
+        changed = self.buffer.take_dirty()
+        if changed is not None:
+            offset, data = changed
+            self.sink(offset, data)
@@ -0,0 +1,114 @@
+import marshal
+import os
+
+import yaml
+
+from sequence import validate_actions
+from storage import content_digest, file_stamp, write_files
+
+try:
+    # libyaml's C parser is several times faster than the pure-Python one
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+CONFIG_DIR = 'config'
+
+# Bumped whenever the cached representation changes
+CACHE_VERSION = 1
+
+
+def program_path(name, config_dir=CONFIG_DIR):
+    # 'C1' -> config/c1.yaml
+    return os.path.join(config_dir, f'{name.lower()}.yaml')
+
+
+def cache_path(path):
+    # config/c1.yaml -> config/.c1.yaml.cache
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f'.{filename}.cache')
+
+
+def load_yaml(source):
+    return yaml.load(source, Loader=SafeLoader)
+
+
+def read_cache(path, digest):
+    try:
+        with open(cache_path(path), 'rb') as file:
+            # loads() on the whole buffer; load() on a file reads in tiny chunks
+            version, cached_digest, actions = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION or cached_digest != digest:
+        return None
+    return actions
+
+
+def write_cache(path, digest, actions):
+    target = cache_path(path)
+    tmp = target + '.tmp'
+    try:
+        # Values marshal cannot hold (YAML dates, timestamps) raise
+        # ValueError; such a program is simply parsed on every load
+        data = marshal.dumps((CACHE_VERSION, digest, actions))
+    except ValueError:
+        return
+    try:
+        with open(tmp, 'wb') as file:
+            file.write(data)
+        os.replace(tmp, target)
+    except OSError:
+        # A read-only config dir just means every boot parses the YAML
+        pass
+
+
+def parse_program(path):
+    # The validated actions of a program are cached next to the source in
+    # marshal format, keyed by a hash of the YAML bytes. Hashing is far
+    # cheaper than parsing, so an unchanged program never hits the YAML parser.
+    with open(path, 'rb') as file:
+        source = file.read()
+    digest = content_digest(source)
+    actions = read_cache(path, digest)
+    if actions is None:
+        data = load_yaml(source) or {}
+        if not isinstance(data, dict):
+            raise ValueError("program must be a mapping with 'actions'")
+        actions = validate_actions(data.get('actions', []))
+        write_cache(path, digest, actions)
+    return actions
+
+
+def dump_program(actions):
+    return yaml.dump({'actions': actions}, Dumper=SafeDumper,
+                     default_flow_style=False, sort_keys=False).encode('utf-8')
+
+
+def save_programs(programs):
+    # Write several programs ({path: actions}) as one atomic batch; programs
+    # whose YAML would not change are skipped. The compiled cache is written
+    # along with them so the next boot does not parse them either.
+    sources = {path: dump_program(validate_actions(actions)) for path, actions in programs.items()}
+    written = write_files(sources)
+    for path in written:
+        write_cache(path, content_digest(sources[path]), programs[path])
+    return written
+
+
+class ProgramCache(object):
+    # Parsed programs keyed by path. A file is only reparsed when its mtime or
+    # size changed since the last look, so checking every program costs one
+    # stat() each and can run whenever a screen is opened.
+    def __init__(self):
+        self._entries = {}
+
+    def load(self, path):
+        # Returns (actions, reloaded)
+        stamp = file_stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], False
+        actions = parse_program(path) if stamp is not None else []
+        self._entries[path] = (stamp, actions)
+        return actions, True
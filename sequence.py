@@ -0,0 +1,231 @@
+from collections import namedtuple
+
+# Devices a program can drive; "All" in a config file addresses every one of them
+DEVICES = ('Steam', 'Hotwater', 'Vacuum')
+ALL_DEVICES = 'All'
+
+UNIT_SECONDS = {'sec': 1, 'min': 60}
+
+# One compiled step: fire `action` ('start' or 'stop') on `device` at `offset`
+# seconds after the start of the block it belongs to (of the sequence, once
+# the timeline yields it)
+Step = namedtuple('Step', ('offset', 'action', 'device', 'level'))
+
+# Deepest nesting of repeat/call blocks a program may use
+MAX_DEPTH = 32
+
+
+class Block(object):
+    # A compiled list of actions: Steps and Repeats with offsets relative to
+    # the start of the block. Repeats keep a reference to their body, so a
+    # loop or a subroutine called many times is compiled and stored once.
+    def __init__(self, items, duration):
+        self.items = tuple(items)
+        self.duration = duration
+        self.count = sum(item.count if isinstance(item, Repeat) else 1 for item in self.items)
+
+    def steps(self, base=0.0):
+        # Generator of absolute steps; nothing is materialized
+        for item in self.items:
+            if isinstance(item, Repeat):
+                yield from item.steps(base)
+            elif base:
+                yield item._replace(offset=base + item.offset)
+            else:
+                yield item
+
+
+class Repeat(object):
+    # `block` run `times` times back to back, starting at `offset`; a
+    # subroutine call is a Repeat of the subroutine's block once
+    def __init__(self, offset, block, times=1):
+        self.offset = offset
+        self.block = block
+        self.times = times
+        self.count = block.count * times
+
+    @property
+    def duration(self):
+        return self.block.duration * self.times
+
+    def steps(self, base=0.0):
+        start = base + self.offset
+        for iteration in range(self.times):
+            yield from self.block.steps(start + iteration * self.block.duration)
+
+
+class Timeline(object):
+    # A program compiled once into a tree of blocks. Iterating yields the
+    # absolute-offset steps lazily, so a long loop costs its body, not the
+    # number of iterations.
+    def __init__(self, block):
+        self.block = block
+        self.duration = block.duration
+
+    def __len__(self):
+        return self.block.count
+
+    def __iter__(self):
+        return self.block.steps()
+
+
+def expand_device(device):
+    if device == ALL_DEVICES:
+        return DEVICES
+    return (device,)
+
+
+def delay_seconds(action):
+    unit = action.get('unit', 'sec')
+    if unit not in UNIT_SECONDS:
+        raise ValueError(f"Unknown delay unit: {unit!r}")
+    return float(action.get('amount', 0)) * UNIT_SECONDS[unit]
+
+
+def describe_action(action):
+    action_type = str(action.get('type', '')).capitalize()
+    if action_type == 'Start':
+        device = action.get('device', 'Unknown')
+        level = action.get('level', 'Unknown')
+        return f"Start {device} at {level} level."
+    elif action_type == 'Stop':
+        device = action.get('device', 'Unknown')
+        return f"Stop {device}."
+    elif action_type == 'Delay':
+        amount = action.get('amount', 'Unknown')
+        unit = action.get('unit', 'Unknown')
+        return f"Delay for {amount} {unit}."
+    elif action_type == 'Repeat':
+        times = action.get('times', 'Unknown')
+        return f"Repeat {times} times:"
+    elif action_type == 'Define':
+        name = action.get('name', 'Unknown')
+        return f"Subroutine {name}:"
+    elif action_type == 'Call':
+        name = action.get('name', 'Unknown')
+        return f"Call {name}."
+    else:
+        return "Unknown action."
+
+
+def subroutines(actions):
+    # {name: actions} of the top-level "define" entries
+    return {action['name']: action['actions'] for action in actions
+            if str(action.get('type', '')).lower() == 'define'}
+
+
+def validate_actions(actions, names=None, path='Action '):
+    # Structural check of a program as read from YAML; raises ValueError.
+    # Subroutines are defined at the top level and may be called from
+    # anywhere, including other subroutines, but not recursively.
+    if not isinstance(actions, list):
+        raise ValueError("'actions' must be a list")
+    top_level = names is None
+    if top_level:
+        names = set()
+        for action in actions:
+            if isinstance(action, dict) and str(action.get('type', '')).lower() == 'define':
+                if not isinstance(action.get('name'), str):
+                    raise ValueError("A subroutine needs a name")
+                if action['name'] in names:
+                    raise ValueError(f"Subroutine {action['name']!r} is defined twice")
+                names.add(action['name'])
+    for index, action in enumerate(actions):
+        where = f"{path}{index}"
+        if not isinstance(action, dict):
+            raise ValueError(f"{where} is not a mapping")
+        action_type = str(action.get('type', '')).lower()
+        if action_type == 'delay':
+            amount = action.get('amount')
+            if not isinstance(amount, (int, float)) or isinstance(amount, bool) or amount < 0:
+                raise ValueError(f"{where}: delay amount must be a non-negative number")
+            if action.get('unit', 'sec') not in UNIT_SECONDS:
+                raise ValueError(f"{where}: unknown delay unit {action.get('unit')!r}")
+        elif action_type in ('start', 'stop'):
+            if not isinstance(action.get('device'), str):
+                raise ValueError(f"{where}: {action_type} needs a device")
+        elif action_type == 'repeat':
+            times = action.get('times')
+            if not isinstance(times, int) or isinstance(times, bool) or times < 0:
+                raise ValueError(f"{where}: repeat times must be a non-negative integer")
+            validate_actions(action.get('actions'), names, f"{where}.")
+        elif action_type == 'define':
+            if not top_level:
+                raise ValueError(f"{where}: subroutines can only be defined at the top level")
+            validate_actions(action.get('actions'), names, f"{where}.")
+        elif action_type == 'call':
+            if action.get('name') not in names:
+                raise ValueError(f"{where}: call of undefined subroutine {action.get('name')!r}")
+        else:
+            raise ValueError(f"{where}: unknown action type {action.get('type')!r}")
+    if top_level:
+        # Compiling detects recursive calls and excessive nesting, including
+        # in subroutines the program never calls
+        compiler = Compiler(subroutines(actions))
+        compiler.block(actions)
+        for name in compiler.definitions:
+            compiler.subroutine(name, 1)
+    return actions
+
+
+def compile_actions(actions):
+    return Timeline(Compiler(subroutines(actions)).block(actions))
+
+
+class Compiler(object):
+    # Compiles nested actions into Blocks. Each subroutine is compiled once,
+    # on its first call, and shared by every call site.
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self.compiled = {}
+        self.calling = []
+
+    def block(self, actions, depth=0):
+        if depth > MAX_DEPTH:
+            raise ValueError(f"Blocks are nested more than {MAX_DEPTH} deep")
+        items = []
+        offset = 0.0
+        for action in actions:
+            # Same case-insensitive reading of 'type' as describe_action
+            action_type = str(action.get('type', '')).lower()
+            if action_type == 'delay':
+                offset += delay_seconds(action)
+            elif action_type == 'start':
+                items.append(Step(offset, 'start', action.get('device', 'Unknown'), action.get('level')))
+            elif action_type == 'stop':
+                items.append(Step(offset, 'stop', action.get('device', 'Unknown'), None))
+            elif action_type == 'repeat':
+                body = self.block(action.get('actions', []), depth + 1)
+                repeat = Repeat(offset, body, int(action.get('times', 0)))
+                if repeat.times and (body.items or body.duration):
+                    items.append(repeat)
+                offset += repeat.duration
+            elif action_type == 'call':
+                body = self.subroutine(action.get('name'), depth + 1)
+                if body.items or body.duration:
+                    items.append(Repeat(offset, body))
+                offset += body.duration
+            elif action_type != 'define':
+                raise ValueError(f"Unknown action type: {action.get('type')!r}")
+        return Block(items, offset)
+
+    def subroutine(self, name, depth):
+        if name in self.compiled:
+            return self.compiled[name]
+        if name not in self.definitions:
+            raise ValueError(f"Call of undefined subroutine {name!r}")
+        if name in self.calling:
+            raise ValueError(f"Subroutine {name!r} calls itself: {' -> '.join(self.calling + [name])}")
+        self.calling.append(name)
+        try:
+            block = self.compiled[name] = self.block(self.definitions[name], depth)
+        finally:
+            self.calling.pop()
+        return block
+
+
+def apply_step(states, step):
+    # Device state is the running level, or None when the device is off
+    for device in expand_device(step.device):
+        states[device] = step.level if step.action == 'start' else None
+    return states
@@ -0,0 +1,76 @@
+import os
+
+import yaml
+
+import storage
+
+SETTINGS_PATH = os.path.join('config', 'settings.yaml')
+# Values changed from the Settings screen, applied over settings.yaml
+LOCAL_PATH = os.path.join('config', 'settings.local.yaml')
+
+DEFAULTS = {
+    'pigpio': {'host': 'localhost', 'port': 8888},
+    # Status strip: data pin, number of pixels and the refresh rate cap
+    'neopixel': {'pixels': 12, 'fps': 20},
+    # GPIO pin driving each device. Empty by default: pins drive real
+    # outputs, so only the ones configured in settings.yaml are used
+    'devices': {},
+    # PWM duty cycle (0-255) for each start level
+    'levels': {'min': 85, 'med': 170, 'max': 255},
+    # Seconds allowed for driving the outputs low, and the countdown shown
+    # before the app exits
+    'shutdown': {'deadline': 2.0, 'countdown': 5},
+    # Opt-in latency histograms (see instrumentation.py), shown on an
+    # overlay and written to `dump` when the app exits
+    'instrumentation': {'enabled': False, 'overlay': True, 'dump': 'instrumentation.json'},
+    # Minutes without input before standby (0 disables it), dim level of the
+    # display in standby (1 blanks it) and the frame rate cap while asleep
+    'standby': {'timeout': 120, 'dim': 0.85, 'fps': 5},
+    # Display backlight on a hardware PWM pin (None: no backlight control),
+    # PWM frequency in Hz, brightness in percent and fade time in seconds,
+    # sent as `steps` updates
+    'backlight': {'pin': None, 'frequency': 20000, 'brightness': 100, 'fade': 0.4, 'steps': 8},
+    # Boiler control loop (see heater.py): `mode` pid or hysteresis, setpoint
+    # in degrees C, loop rate in Hz and seconds of history kept. Only the
+    # simulated boiler is available as a sensor so far.
+    'heater': {'enabled': False, 'sensor': 'simulated', 'mode': 'pid', 'setpoint': 95.0, 'rate': 10,
+               'history': 600, 'band': 2.0, 'kp': 0.2, 'ki': 0.002, 'kd': 10.0},
+    # Binary event log for service diagnostics (see eventlog.py); sizes in
+    # bytes, intervals in seconds
+    'eventlog': {'enabled': True, 'directory': os.path.join('logs', 'events'), 'segment_size': 4 << 20,
+                 'commit_interval': 1.0, 'keep_raw': 4, 'sample_interval': 10.0, 'retention_days': 90,
+                 'max_bytes': 256 << 20},
+}
+
+
+def read_sections(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        data = yaml.safe_load(file) or {}
+    return data.get('settings') or {}
+
+
+def load_settings(path=SETTINGS_PATH, local_path=LOCAL_PATH):
+    # Defaults, then settings.yaml, then the values changed from the UI
+    settings = {key: dict(value) for key, value in DEFAULTS.items()}
+    for sections in (read_sections(path), read_sections(local_path)):
+        for key, value in sections.items():
+            if isinstance(value, dict) and isinstance(settings.get(key), dict):
+                settings[key].update(value)
+            else:
+                settings[key] = value
+    return settings
+
+
+def save_settings(updates, local_path=LOCAL_PATH):
+    # Writes {section: {key: value}} changed from the UI into their own
+    # file, so the hand-edited settings.yaml and its comments are never
+    # rewritten
+    sections = read_sections(local_path)
+    for section, values in updates.items():
+        if not isinstance(sections.get(section), dict):
+            sections[section] = {}
+        sections[section].update(values)
+    data = yaml.safe_dump({'settings': sections}, sort_keys=False)
+    storage.write_files({local_path: data.encode('utf-8')})
@@ -0,0 +1,177 @@
+import logging
+import threading
+from time import monotonic
+
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.core.window import Window
+from kivy.graphics import Color, Line, RoundedRectangle
+from kivy.logger import Logger, LoggerHistory
+from kivy.uix.label import Label
+from kivy.uix.screenmanager import NoTransition, Screen
+
+import eventlog
+from gpio import PigpioError
+
+
+class ShutdownScreen(Screen):
+    # Countdown shown while the machine shuts down
+    def __init__(self, **kwargs):
+        super(ShutdownScreen, self).__init__(**kwargs)
+        with self.canvas.before:
+            Color(0, 0.478, 0.905, 1)  # #007ae7 color
+            self.bg_rect = RoundedRectangle(pos=self.pos, size=Window.size)
+
+        # Display shutdown message with border
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self.shutdown_rect = RoundedRectangle(
+                size=(Window.width * 0.6, Window.height * 0.2),
+                pos=(Window.width * 0.2, Window.height * 0.4),
+                radius=[20]
+            )
+            Color(0, 0, 0, 1)
+            Line(
+                rounded_rectangle=(
+                    Window.width * 0.2, Window.height * 0.4,
+                    Window.width * 0.6, Window.height * 0.2, 20
+                ),
+                width=2
+            )
+
+        self.countdown_label = Label(
+            text="",
+            font_size='30sp',
+            size_hint=(None, None),
+            size=(Window.width * 0.6, Window.height * 0.2),
+            pos=(Window.width * 0.2, Window.height * 0.4),
+            color=(0, 0, 0, 1)
+        )
+        self.add_widget(self.countdown_label)
+
+    def show_countdown(self, seconds):
+        self.countdown_label.text = f"Shutting down in {seconds}"
+
+
+class OutputTeardown(object):
+    # Drives every output low over two paths at once. The stop batch goes
+    # straight to pigpiod on a spare pool connection from its own thread, so
+    # it is not queued behind the I/O worker, which may be busy or retrying
+    # a dead link. The same stops are also queued on the worker: they replace
+    # anything still pending for those devices, so a start already in flight
+    # there cannot leave an output high after the direct batch.
+    def __init__(self, pool, devices, worker):
+        self.pool = pool
+        self.devices = devices
+        self.worker = worker
+        self.direct_done = threading.Event()
+        self.direct_error = None
+        self.started_at = None
+        # Seconds from start until pigpiod confirmed the direct batch
+        self.confirmed_after = None
+
+    def start(self):
+        self.started_at = monotonic()
+        commands = [command for name in self.devices.pins for command in self.devices.commands(name, None)]
+        threading.Thread(target=self._send, args=(commands,), name='shutdown', daemon=True).start()
+        self.devices.stop_all()
+        return self
+
+    def _send(self, commands):
+        try:
+            results = self.pool.pipeline(commands)
+            failed = [command for command, result in zip(commands, results) if result < 0]
+            if failed:
+                self.direct_error = PigpioError(f"pigpiod rejected {len(failed)} stop command(s)")
+            else:
+                self.confirmed_after = monotonic() - self.started_at
+        except OSError as exc:
+            self.direct_error = exc
+        self.direct_done.set()
+
+    def wait(self, deadline):
+        # Waits until both paths are done or `deadline` seconds after start;
+        # True when the direct batch confirmed every output low
+        remaining = max(0.0, self.started_at + deadline - monotonic())
+        self.direct_done.wait(remaining)
+        self.worker.stop(timeout=max(0.0, self.started_at + deadline - monotonic()))
+        return self.direct_done.is_set() and self.direct_error is None
+
+
+class ShutdownService(object):
+    # The one way the app shuts down: cancels every running sequence, drives
+    # every output low within `deadline` seconds, shows the countdown, runs
+    # the registered flush hooks (logs, persistent counters) and exits.
+    # Outputs go low as soon as OFF is pressed, the `heater` loop included;
+    # the countdown only delays the exit.
+    def __init__(self, scheduler, devices, worker, pool, heater=None, deadline=2.0, countdown=5):
+        self.scheduler = scheduler
+        self.devices = devices
+        self.heater = heater
+        self.worker = worker
+        self.pool = pool
+        self.deadline = deadline
+        self.countdown = countdown
+        # Called without arguments just before the app exits
+        self.flush_hooks = []
+        self.teardown = None
+        self.manager = None
+        self.remaining = countdown
+        self._event = None
+
+    @property
+    def started(self):
+        return self.teardown is not None
+
+    def begin(self, manager=None):
+        if self.started:
+            return
+        Logger.info("Shutdown: OFF pressed")
+        eventlog.record(eventlog.KIND_PRESS, eventlog.SUBJECT_OFF)
+        self.scheduler.cancel_all(stop=False)
+        self.teardown = OutputTeardown(self.pool, self.devices, self.worker).start()
+        if self.heater is not None:
+            self.heater.stop()
+
+        self.manager = manager = manager or App.get_running_app().root
+        if not manager.has_screen('shutdown'):
+            manager.add_widget(ShutdownScreen(name='shutdown'))
+        manager.transition = NoTransition()
+        manager.current = 'shutdown'
+        self.remaining = self.countdown
+        self.show_countdown()
+        self._event = Clock.schedule_interval(self.tick, 1)
+
+    def show_countdown(self):
+        self.manager.get_screen('shutdown').show_countdown(self.remaining)
+
+    def tick(self, dt):
+        self.remaining -= 1
+        if self.remaining > 0:
+            self.show_countdown()
+            return
+        self._event.cancel()
+        self._event = None
+        self.finish()
+
+    def finish(self):
+        if self.teardown.wait(self.deadline):
+            Logger.info(f"Shutdown: outputs low {self.teardown.confirmed_after * 1000:.0f} ms after OFF")
+        else:
+            Logger.error(f"Shutdown: outputs not confirmed low within {self.deadline}s: "
+                         f"{self.teardown.direct_error or 'timed out'}")
+        for hook in self.flush_hooks:
+            try:
+                hook()
+            except Exception as exc:
+                Logger.error(f"Shutdown: flush hook {hook!r} failed: {exc}")
+        flush_logs()
+        App.get_running_app().stop()
+
+
+def flush_logs():
+    # Kivy installs its handlers on the root logger; LoggerHistory.flush()
+    # would clear the in-memory history instead of writing anything
+    for handler in logging.root.handlers + Logger.handlers:
+        if not isinstance(handler, LoggerHistory):
+            handler.flush()
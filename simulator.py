@@ -0,0 +1,145 @@
+# Headless simulator for action sequences. Programs are compiled with the
+# same semantics the machine runs (sequence.compile_actions) and played on a
+# virtual clock that jumps straight to the next step, so an hour-long
+# cleaning program simulates in well under a millisecond. No Kivy needed.
+#
+#   python simulator.py config/c1.yaml [config/c3.yaml ...]
+#   python simulator.py --fuzz 5000 [--seed 1]
+import argparse
+import random
+from collections import namedtuple
+
+import yaml
+
+from sequence import DEVICES, UNIT_SECONDS, apply_step, compile_actions, describe_action
+
+# Device states right after everything due at `time` has fired
+Snapshot = namedtuple('Snapshot', ('time', 'states'))
+SimulationResult = namedtuple('SimulationResult', ('snapshots', 'duration'))
+
+
+class VirtualClock(object):
+    # Simulated time in seconds; it only moves when the simulator advances it
+    def __init__(self):
+        self.now = 0.0
+
+    def advance_to(self, time):
+        if time < self.now:
+            raise ValueError(f"Clock cannot go back from {self.now} to {time}")
+        self.now = time
+
+
+def simulate(actions, clock=None):
+    clock = clock or VirtualClock()
+    timeline = compile_actions(actions)
+    states = dict.fromkeys(DEVICES)
+    snapshots = []
+    for step in timeline:
+        clock.advance_to(step.offset)
+        apply_step(states, step)
+        # Steps sharing an offset fire together, so they share one snapshot
+        if snapshots and snapshots[-1].time == clock.now:
+            snapshots[-1] = Snapshot(clock.now, dict(states))
+        else:
+            snapshots.append(Snapshot(clock.now, dict(states)))
+    clock.advance_to(timeline.duration)
+    return SimulationResult(snapshots, timeline.duration)
+
+
+def load_actions(path):
+    with open(path, 'r') as file:
+        data = yaml.safe_load(file) or {}
+    return data.get('actions', [])
+
+
+def random_actions(rng, length, depth=0):
+    # Random but well-formed program, for fuzzing; repeat blocks nest up to
+    # two levels deep
+    actions = []
+    for _ in range(length):
+        kind = rng.choice(('start', 'stop', 'delay', 'repeat') if depth < 2 else ('start', 'stop', 'delay'))
+        if kind == 'repeat':
+            actions.append({'type': 'repeat', 'times': rng.randint(0, 5),
+                            'actions': random_actions(rng, rng.randint(0, 5), depth + 1)})
+        elif kind == 'delay':
+            actions.append({'type': 'delay', 'amount': rng.randint(0, 1000),
+                            'unit': rng.choice(list(UNIT_SECONDS))})
+        else:
+            action = {'type': kind, 'device': rng.choice(DEVICES + ('All',))}
+            if kind == 'start':
+                action['level'] = rng.choice(('min', 'med', 'max'))
+            actions.append(action)
+    return actions
+
+
+def expected_seconds(actions):
+    # Program length computed straight from the YAML structure
+    total = 0
+    for action in actions:
+        if action['type'] == 'delay':
+            total += action['amount'] * UNIT_SECONDS[action['unit']]
+        elif action['type'] == 'repeat':
+            total += action['times'] * expected_seconds(action['actions'])
+    return total
+
+
+def check(actions, result):
+    # Invariants every simulated program must satisfy
+    expected = expected_seconds(actions)
+    assert result.duration == expected, (result.duration, expected)
+    times = [snapshot.time for snapshot in result.snapshots]
+    assert times == sorted(set(times)), times
+    assert all(snapshot.time <= result.duration for snapshot in result.snapshots)
+    for snapshot in result.snapshots:
+        assert set(snapshot.states) == set(DEVICES), snapshot
+
+
+def fuzz(count, seed=None, max_length=200):
+    rng = random.Random(seed)
+    for _ in range(count):
+        actions = random_actions(rng, rng.randint(0, max_length))
+        check(actions, simulate(actions))
+
+
+def walk_actions(actions, depth=0):
+    # (depth, action) for every action, nested blocks included
+    for action in actions:
+        yield depth, action
+        if str(action.get('type', '')).lower() in ('repeat', 'define'):
+            yield from walk_actions(action.get('actions', []), depth + 1)
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def format_states(states):
+    return '  '.join(f"{device}={states[device] or 'off'}" for device in DEVICES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--fuzz', type=int, default=0, help='number of random programs to check')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    for path in args.files:
+        actions = load_actions(path)
+        result = simulate(actions)
+        print(f"{path}: {len(actions)} actions, {format_time(result.duration)} total")
+        for depth, action in walk_actions(actions):
+            print(f"    {'  ' * depth}{describe_action(action)}")
+        for snapshot in result.snapshots:
+            print(f"  {format_time(snapshot.time)}  {format_states(snapshot.states)}")
+        print(f"  {format_time(result.duration)}  end")
+
+    if args.fuzz:
+        fuzz(args.fuzz, args.seed)
+        print(f"fuzz: {args.fuzz} programs OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+from time import monotonic
+
+from kivy.clock import Clock
+from kivy.event import EventDispatcher
+from kivy.graphics import Color, Rectangle
+from kivy.logger import Logger
+from kivy.properties import BooleanProperty
+from kivy.uix.widget import Widget
+
+import instrumentation
+
+
+class DimOverlay(Widget):
+    # Black layer over the whole window; opacity 1 blanks the display
+    def __init__(self, window, level, **kwargs):
+        super(DimOverlay, self).__init__(**kwargs)
+        self.window = window
+        with self.canvas:
+            Color(0, 0, 0, level)
+            self.rect = Rectangle(pos=(0, 0), size=window.size)
+
+    def show(self):
+        self.rect.size = self.window.size
+        self.window.add_widget(self)
+
+    def hide(self):
+        self.window.remove_widget(self)
+
+
+class Standby(EventDispatcher):
+    # Puts the UI to sleep after `timeout` minutes without touch or key
+    # input (0 disables it): the frame rate drops to `fps`, registered
+    # intervals are paused and the display is dimmed by `dim` (1 blanks it):
+    # through the hardware `backlight` when there is one, which also saves
+    # power, otherwise by a black overlay.
+    # The first touch in standby only wakes the machine; it is not passed on
+    # to the screen underneath. Wake latency, from that touch to the first
+    # frame drawn afterwards, is logged and kept in `wake_latency`.
+    #
+    # Activity is only timestamped; a single pending Clock event checks for
+    # the timeout, so input costs nothing extra while awake.
+    active = BooleanProperty(False)
+
+    def __init__(self, window, timeout=120, dim=0.85, fps=5, backlight=None, **kwargs):
+        super(Standby, self).__init__(**kwargs)
+        self.window = window
+        self.timeout = timeout
+        self.dim = dim
+        self.fps = fps
+        self.backlight = backlight
+        self.overlay = DimOverlay(window, dim)
+        self.wake_latency = None
+        self.last_activity = monotonic()
+        self._intervals = []
+        self._paused = []
+        self._saved_fps = None
+        self._check = None
+        self._woken_by = None
+
+    def start(self):
+        self.window.bind(on_touch_down=self.on_input, on_touch_move=self.on_input,
+                         on_touch_up=self.on_input, on_key_down=self.on_input)
+        self.schedule_check()
+        return self
+
+    def register(self, event):
+        # A non-essential ClockEvent to pause while in standby
+        self._intervals.append(event)
+
+    def unregister(self, event):
+        if event in self._intervals:
+            self._intervals.remove(event)
+
+    def set_timeout(self, minutes):
+        self.timeout = minutes
+        self.last_activity = monotonic()
+        self.schedule_check()
+
+    def schedule_check(self, delay=None):
+        if self._check is not None:
+            self._check.cancel()
+            self._check = None
+        if self.timeout > 0:
+            if delay is None:
+                delay = self.timeout * 60
+            self._check = Clock.schedule_once(self.check_idle, delay)
+
+    def check_idle(self, dt):
+        self._check = None
+        idle = monotonic() - self.last_activity
+        if idle >= self.timeout * 60:
+            self.enter()
+        else:
+            self.schedule_check(self.timeout * 60 - idle)
+
+    def on_input(self, window, *args):
+        self.last_activity = monotonic()
+        if not self.active:
+            return False
+        # Touch events carry the touch; key events carry the key code
+        touch = args[0] if args and hasattr(args[0], 'time_start') else None
+        self.wake(touch)
+        # Swallow the waking input
+        return True
+
+    def enter(self):
+        if self.active:
+            return
+        self.active = True
+        self._paused = [event for event in self._intervals if event.is_triggered]
+        for event in self._paused:
+            event.cancel()
+        self._saved_fps = Clock._max_fps
+        Clock._max_fps = self.fps
+        if self.backlight is not None:
+            self.backlight.dim(self.dim)
+        else:
+            self.overlay.show()
+        Logger.info(f"Standby: idle for {self.timeout} min, entering standby")
+
+    def wake(self, touch=None):
+        if not self.active:
+            return
+        Clock._max_fps = self._saved_fps
+        if self.backlight is not None:
+            self.backlight.restore()
+        else:
+            self.overlay.hide()
+        for event in self._paused:
+            # An interval cancelled and unregistered during standby stays
+            # stopped; calling a cancelled ClockEvent would schedule it again
+            if event in self._intervals:
+                event()
+        self._paused = []
+        self.active = False
+        self._woken_by = instrumentation.touch_time(touch) if touch is not None else monotonic()
+        # On the backlight path nothing on screen changes, so without asking
+        # for a frame on_flip would wait for the next unrelated redraw
+        self.window.canvas.ask_update()
+        self.window.bind(on_flip=self.on_first_frame)
+        self.schedule_check()
+
+    def on_first_frame(self, *args):
+        self.window.unbind(on_flip=self.on_first_frame)
+        self.wake_latency = monotonic() - self._woken_by
+        Logger.info(f"Standby: woke in {self.wake_latency * 1000:.0f} ms")
+        if instrumentation.recorder is not None:
+            instrumentation.recorder.add('wake', self.wake_latency)
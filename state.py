@@ -0,0 +1,16 @@
+from kivy.event import EventDispatcher
+from kivy.properties import BooleanProperty, DictProperty, NumericProperty
+
+
+class MachineState(EventDispatcher):
+    # Observable machine state; screens bind to the properties they show
+    # instead of polling, so a change reaches the display on the next frame
+    heating = BooleanProperty(False)
+    # Boiler temperature in degrees C, None until the heater loop reports
+    temperature = NumericProperty(None, allownone=True)
+    # Current level of each device, None when it is off
+    devices = DictProperty({})
+
+
+# Shared instance used by every screen
+machine_state = MachineState()
@@ -0,0 +1,296 @@
+from collections import deque, namedtuple
+
+# One editable step of a program. Records are immutable; an edit replaces
+# the record with a new one carrying the same uid.
+#   kind:   'start_stop', 'delay', 'repeat', 'define', 'call' or 'end'
+#   action: 'start', 'stop' or None while unset (start_stop only)
+#   level:  'min', 'med', 'max' or None (start only)
+#   amount: int or None, unit: 'sec' or 'min' (delay; amount is the count
+#           for repeat)
+#   name:   subroutine name (define and call)
+# Nested blocks are flattened: a 'repeat' or 'define' step opens a block
+# that runs until the matching 'end' step.
+Step = namedtuple('Step', ('uid', 'kind', 'action', 'device', 'level', 'amount', 'unit', 'name'))
+
+# Step kinds that open a block
+BLOCK_KINDS = ('repeat', 'define')
+
+
+class ProgramModel(object):
+    # Ordered list of step records with a uid -> position index, so the
+    # editor can find, update and swap steps in O(1) instead of scanning the
+    # widget tree. Insert/remove shift the tail of the list and mark the
+    # index stale from that point; it is rebuilt lazily on the next lookup.
+    #
+    # Structural changes are reported to `listeners` as
+    # listener(kind, position, other) with kind 'insert', 'remove', 'swap'
+    # or 'move' (other is the second position) or 'load'. Every change, including
+    # field updates, is also recorded in `history` when one is attached.
+    def __init__(self, history=None):
+        self.steps = []
+        self._records = {}
+        self._positions = {}
+        self._stale_from = 0
+        self._next_uid = 1
+        self.listeners = []
+        self.history = history
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __getitem__(self, position):
+        return self.steps[position]
+
+    def get(self, uid):
+        return self._records[uid]
+
+    def position(self, uid):
+        if self._stale_from < len(self.steps):
+            for position in range(self._stale_from, len(self.steps)):
+                self._positions[self.steps[position].uid] = position
+            self._stale_from = len(self.steps)
+        return self._positions[uid]
+
+    def _changed(self, kind, position=None, other=None):
+        for listener in self.listeners:
+            listener(kind, position, other)
+
+    def _record(self, *entry):
+        if self.history is not None:
+            self.history.record(entry)
+
+    def new_step(self, kind, action=None, device=None, level=None, amount=None, unit=None, name=None):
+        step = Step(self._next_uid, kind, action, device, level, amount, unit, name)
+        self._next_uid += 1
+        return step
+
+    def insert(self, position, step):
+        self.steps.insert(position, step)
+        self._records[step.uid] = step
+        self._stale_from = min(self._stale_from, position)
+        self._record('insert', position, step)
+        self._changed('insert', position)
+        return step
+
+    def append(self, step):
+        return self.insert(len(self.steps), step)
+
+    def remove(self, uid):
+        position = self.position(uid)
+        step = self.steps.pop(position)
+        del self._records[uid]
+        del self._positions[uid]
+        self._stale_from = min(self._stale_from, position)
+        self._record('remove', position, step)
+        self._changed('remove', position)
+        return position
+
+    def update(self, uid, **fields):
+        old = self._records[uid]
+        step = old._replace(**fields)
+        if step == old:
+            return step
+        self._set(step)
+        self._record('update', old, step)
+        return step
+
+    def _set(self, step):
+        self.steps[self.position(step.uid)] = step
+        self._records[step.uid] = step
+
+    def swap(self, uid, offset):
+        # Exchange a step with its neighbour `offset` (-1 up, +1 down); O(1)
+        position = self.position(uid)
+        other = position + offset
+        if not 0 <= other < len(self.steps):
+            return False
+        steps = self.steps
+        steps[position], steps[other] = steps[other], steps[position]
+        self._positions[steps[position].uid] = position
+        self._positions[steps[other].uid] = other
+        self._record('swap', position, other)
+        self._changed('swap', position, other)
+        return True
+
+    def move(self, uid, position):
+        # Move a step to `position` (its index after the move) as a single
+        # change; only the steps between the two positions change index
+        old = self.position(uid)
+        position = max(0, min(position, len(self.steps) - 1))
+        if position == old:
+            return False
+        steps = self.steps
+        steps.insert(position, steps.pop(old))
+        for index in range(min(old, position), max(old, position) + 1):
+            self._positions[steps[index].uid] = index
+        self._record('move', old, position)
+        self._changed('move', old, position)
+        return True
+
+    def replace_all(self, steps):
+        old = tuple(self.steps)
+        self.steps = list(steps)
+        self._records = {step.uid: step for step in self.steps}
+        self._positions = {}
+        self._stale_from = 0
+        self._record('load', old, tuple(self.steps))
+        self._changed('load')
+
+    def load_actions(self, actions):
+        steps = []
+        self.flatten(actions, steps)
+        self.replace_all(steps)
+
+    def flatten(self, actions, steps):
+        for action in actions:
+            action_type = str(action['type']).lower()
+            if action_type == 'delay':
+                steps.append(self.new_step('delay', amount=int(action['amount']), unit=action.get('unit', 'sec')))
+            elif action_type in ('start', 'stop'):
+                level = action.get('level') if action_type == 'start' else None
+                steps.append(self.new_step('start_stop', action=action_type,
+                                           device=action['device'], level=level and level.lower()))
+            elif action_type == 'call':
+                steps.append(self.new_step('call', name=action['name']))
+            elif action_type in BLOCK_KINDS:
+                steps.append(self.new_step(action_type, amount=action.get('times'), name=action.get('name')))
+                self.flatten(action['actions'], steps)
+                steps.append(self.new_step('end'))
+
+    def to_actions(self):
+        # Serialize to the config file format; incomplete steps are skipped.
+        # A block left open runs to the end of the program and a stray
+        # 'end' is ignored.
+        actions = []
+        stack = []
+        for step in self.steps:
+            if step.kind == 'end':
+                if stack:
+                    actions = stack.pop()
+            elif step.kind in BLOCK_KINDS:
+                if step.kind == 'repeat':
+                    # An unset count runs the block once
+                    block = {'type': 'repeat', 'times': 1 if step.amount is None else step.amount, 'actions': []}
+                else:
+                    block = {'type': 'define', 'name': step.name, 'actions': []}
+                # A subroutine without a name cannot be called; its block
+                # is still parsed, but dropped
+                if step.kind == 'repeat' or step.name:
+                    actions.append(block)
+                stack.append(actions)
+                actions = block['actions']
+            elif step.kind == 'call':
+                if step.name:
+                    actions.append({'type': 'call', 'name': step.name})
+            elif step.kind == 'delay':
+                if step.amount is not None:
+                    # An unset unit has always been saved as minutes
+                    actions.append({'type': 'delay', 'amount': step.amount, 'unit': step.unit or 'min'})
+            elif step.action is not None and step.device is not None:
+                action = {'type': step.action, 'device': step.device}
+                if step.action == 'start' and step.level is not None:
+                    action['level'] = step.level
+                actions.append(action)
+        return stack[0] if stack else actions
+
+    def apply(self, entry, undo):
+        # Replay a history entry backwards (undo) or forwards (redo) without
+        # recording it again
+        history, self.history = self.history, None
+        try:
+            kind = entry[0]
+            if kind in ('insert', 'remove'):
+                _, position, step = entry
+                if (kind == 'insert') == undo:
+                    self.remove(step.uid)
+                else:
+                    self.insert(position, step)
+            elif kind == 'update':
+                _, old, new = entry
+                self._set(old if undo else new)
+            elif kind == 'swap':
+                _, position, other = entry
+                self.swap(self.steps[position].uid, other - position)
+            elif kind == 'move':
+                _, old, new = entry
+                if undo:
+                    self.move(self.steps[new].uid, old)
+                else:
+                    self.move(self.steps[old].uid, new)
+            elif kind == 'load':
+                _, old, new = entry
+                self.replace_all(old if undo else new)
+        finally:
+            self.history = history
+
+
+# Rough memory cost of a history entry: fixed overhead plus one step record
+# for every step it keeps alive
+ENTRY_COST = 100
+STEP_COST = 150
+
+
+def changed_fields(old, new):
+    return {field for field in Step._fields if getattr(old, field) != getattr(new, field)}
+
+
+def entry_cost(entry):
+    kind = entry[0]
+    if kind == 'load':
+        return ENTRY_COST + STEP_COST * (len(entry[1]) + len(entry[2]))
+    if kind in ('swap', 'move'):
+        return ENTRY_COST
+    return ENTRY_COST + STEP_COST * 2
+
+
+class History(object):
+    # Undo/redo for a ProgramModel. Entries hold only the step records an
+    # edit touched; records are immutable and shared with the model, so an
+    # entry costs O(changed steps) instead of a copy of the program. The
+    # oldest entries are evicted beyond `max_depth` entries or `max_bytes`
+    # of estimated memory.
+    def __init__(self, max_depth=200, max_bytes=4 * 1024 * 1024):
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.size = 0
+
+    def record(self, entry):
+        self.redo_stack.clear()
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if (entry[0] == 'update' and last is not None and last[0] == 'update' and last[2] == entry[1]
+                and changed_fields(*last[1:]) == changed_fields(*entry[1:])):
+            # Consecutive edits of one field (e.g. typing a delay) undo together
+            self.undo_stack[-1] = ('update', last[1], entry[2])
+            return
+        self.undo_stack.append(entry)
+        self.size += entry_cost(entry)
+        while self.undo_stack and (len(self.undo_stack) > self.max_depth or self.size > self.max_bytes):
+            self.size -= entry_cost(self.undo_stack.popleft())
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+
+    def undo(self, model):
+        if not self.undo_stack:
+            return False
+        entry = self.undo_stack.pop()
+        self.size -= entry_cost(entry)
+        model.apply(entry, undo=True)
+        self.redo_stack.append(entry)
+        return True
+
+    def redo(self, model):
+        if not self.redo_stack:
+            return False
+        entry = self.redo_stack.pop()
+        model.apply(entry, undo=False)
+        self.undo_stack.append(entry)
+        self.size += entry_cost(entry)
+        return True
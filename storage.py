@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+# Last known content digest of each file written or checked, keyed by path
+# and valid while the file's (mtime_ns, size) stamp is unchanged
+_digests = {}
+
+
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def stored_digest(path):
+    stamp = file_stamp(path)
+    if stamp is None:
+        return None
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as file:
+        digest = content_digest(file.read())
+    _digests[path] = (stamp, digest)
+    return digest
+
+
+def fsync_directory(directory):
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_files(files):
+    # Atomically replace a batch of files given as {path: bytes}. Files whose
+    # content is unchanged are not touched at all. Every new version is
+    # written and fsynced to a temp file before any rename, so after a power
+    # cut each file holds either its old or its new content, never a torn
+    # mix. Returns the paths that were written.
+    changed = {path: data for path, data in files.items()
+               if stored_digest(path) != content_digest(data)}
+    temps = []
+    try:
+        for path, data in changed.items():
+            tmp = f'{path}.tmp'
+            # Listed before writing, so a failed write is cleaned up too
+            temps.append((tmp, path))
+            with open(tmp, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+        for tmp, path in temps:
+            os.replace(tmp, path)
+    except OSError:
+        for tmp, _ in temps:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        raise
+    for directory in {os.path.dirname(path) for path in changed}:
+        fsync_directory(directory)
+    for path, data in changed.items():
+        _digests[path] = (file_stamp(path), content_digest(data))
+    return list(changed)
@@ -0,0 +1,68 @@
+import random
+
+from analysis import analyze
+from sequence import DEVICES, compile_actions
+from simulator import fuzz, random_actions, simulate
+
+
+def expected_on_time(result):
+    # Seconds each device is on, integrated over the simulated snapshots
+    on_time = dict.fromkeys(DEVICES, 0.0)
+    ends = [snapshot.time for snapshot in result.snapshots[1:]] + [result.duration]
+    for snapshot, end in zip(result.snapshots, ends):
+        for device, level in snapshot.states.items():
+            if level is not None:
+                on_time[device] += end - snapshot.time
+    return on_time
+
+
+def test_analysis_matches_the_expanded_steps():
+    rng = random.Random(7)
+    for _ in range(500):
+        actions = random_actions(rng, rng.randint(0, 12))
+        result = simulate(actions)
+        analysis = analyze(compile_actions(actions))
+        expected = expected_on_time(result)
+        for device in DEVICES:
+            assert abs(analysis.on_time[device] - expected[device]) < 1e-6, (actions, device)
+        ends = [snapshot.time for snapshot in result.snapshots[1:]] + [result.duration]
+        for snapshot, end in zip(result.snapshots, ends):
+            active = {device: level for device, level in snapshot.states.items() if level is not None}
+            for elapsed in (snapshot.time, (snapshot.time + end) / 2):
+                assert analysis.index.active_at(elapsed) == active, (actions, elapsed)
+        running = {conflict.device for conflict in analysis.conflicts if conflict.message.endswith('at the end')}
+        final = result.snapshots[-1].states if result.snapshots else {}
+        assert running == {device for device, level in final.items() if level is not None}
+
+
+def test_long_loops_are_not_expanded():
+    actions = [{'type': 'repeat', 'times': 1000000, 'actions': [
+        {'type': 'start', 'device': 'Steam', 'level': 'max'},
+        {'type': 'delay', 'amount': 2, 'unit': 'sec'},
+        {'type': 'stop', 'device': 'Steam'},
+        {'type': 'delay', 'amount': 3, 'unit': 'sec'},
+        {'type': 'stop', 'device': 'Steam'},
+    ]}]
+    analysis = analyze(compile_actions(actions))
+    assert analysis.on_time['Steam'] == 2000000
+    # Reported once, at the first iteration
+    assert [(conflict.offset, conflict.message) for conflict in analysis.conflicts] == \
+        [(5.0, 'stop Steam while it is not running')]
+
+
+def test_mistake_from_the_second_run_is_reported_there():
+    actions = [
+        {'type': 'start', 'device': 'Vacuum', 'level': 'min'},
+        {'type': 'repeat', 'times': 1000, 'actions': [
+            {'type': 'delay', 'amount': 2, 'unit': 'sec'},
+            {'type': 'stop', 'device': 'Vacuum'},
+        ]},
+    ]
+    analysis = analyze(compile_actions(actions))
+    assert analysis.on_time['Vacuum'] == 2
+    assert [(conflict.offset, conflict.message) for conflict in analysis.conflicts] == \
+        [(4.0, 'stop Vacuum while it is not running')]
+
+
+def test_simulator_fuzz():
+    fuzz(300, seed=1)
@@ -0,0 +1,63 @@
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from devices import DeviceController  # noqa: E402
+from io_worker import IOWorker  # noqa: E402
+from state import machine_state  # noqa: E402
+
+LEVELS = {'min': 85, 'med': 170, 'max': 255}
+
+
+class Connection(object):
+    # Answers every command with `result`
+    def __init__(self):
+        self.result = 0
+
+    def pipeline(self, commands):
+        return [self.result] * len(commands)
+
+
+def flushed(worker):
+    # Sends the queued batch on the calling thread
+    batch = list(worker._pending.items())
+    worker._pending.clear()
+    worker._flush(batch)
+
+
+def test_failed_write_restores_the_acknowledged_state():
+    connection = Connection()
+    worker = IOWorker(connection, report=lambda callback, key, error: callback(key, error))
+    controller = DeviceController(worker, {'Steam': 22}, LEVELS)
+    machine_state.devices = {}
+    try:
+        controller.set('Steam', 'max')
+        flushed(worker)
+        assert machine_state.devices['Steam'] == 'max'
+        connection.result = -41
+        errors = []
+        controller.set('Steam', None, lambda key, error: errors.append((key, error)))
+        assert machine_state.devices['Steam'] is None
+        flushed(worker)
+        assert machine_state.devices['Steam'] == 'max'
+        assert [key for key, error in errors if error is not None] == ['Steam']
+    finally:
+        machine_state.devices = {}
+
+
+def test_stale_failure_leaves_a_newer_request_alone():
+    connection = Connection()
+    worker = IOWorker(connection, report=lambda callback, key, error: callback(key, error))
+    controller = DeviceController(worker, {'Steam': 22}, LEVELS)
+    machine_state.devices = {}
+    try:
+        connection.result = -41
+        controller.set('Steam', 'max')
+        batch = list(worker._pending.items())
+        worker._pending.clear()
+        controller.set('Steam', 'min')
+        # The first request fails after the second was made
+        worker._flush(batch)
+        assert machine_state.devices['Steam'] == 'min'
+    finally:
+        machine_state.devices = {}
@@ -0,0 +1,25 @@
+import os
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from neopixel import STATUS_COLOURS, StatusLeds  # noqa: E402
+from state import machine_state  # noqa: E402
+
+
+def test_segments_stay_inside_a_short_strip():
+    for pixels in range(0, len(STATUS_COLOURS) + 2):
+        leds = StatusLeds(pixels, lambda offset, data: None)
+        for start, end in leds.segments.values():
+            assert 0 <= start <= end <= pixels
+
+
+def test_short_strip_refresh_lights_the_pixels_it_has():
+    writes = []
+    leds = StatusLeds(2, lambda offset, data: writes.append((offset, bytes(data))))
+    machine_state.devices = {'Steam': 'max', 'Vacuum': 'min'}
+    try:
+        leds.refresh()
+    finally:
+        machine_state.devices = {}
+    # Steam is white, vacuum (0, 80, 255) in GRB order
+    assert writes == [(0, bytes((255, 255, 255, 80, 0, 255)))]
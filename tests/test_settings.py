@@ -0,0 +1,27 @@
+import os
+
+from settings import load_settings, save_settings
+
+SOURCE = """settings:
+  # Hand-written note
+  standby:
+    timeout: 120
+  backlight:
+    pin:
+"""
+
+
+def test_saved_values_override_without_rewriting_settings_yaml(tmp_path):
+    path = os.path.join(tmp_path, 'settings.yaml')
+    local_path = os.path.join(tmp_path, 'settings.local.yaml')
+    with open(path, 'w') as file:
+        file.write(SOURCE)
+    save_settings({'standby': {'timeout': 30}}, local_path)
+    save_settings({'backlight': {'brightness': 50}}, local_path)
+    with open(path) as file:
+        assert file.read() == SOURCE
+    settings = load_settings(path, local_path)
+    assert settings['standby']['timeout'] == 30
+    assert settings['backlight']['brightness'] == 50
+    assert settings['backlight']['pin'] is None
+    assert settings['standby']['fps'] == 5